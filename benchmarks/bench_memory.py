@@ -0,0 +1,96 @@
+# coding=utf-8
+"""Memory used per widget (including its item) by the openHAB 2 model, compared with the model before it used
+   __slots__ and lean change tracking (plain dict based Attributes, instance __dict__).
+
+   Creates pages with 50 text widgets each from sitemap data, no server is needed. Every model is measured in a
+   new process, the baseline is taken from git. Linux only (reads the resident set size).
+   Usage: python benchmarks/bench_memory.py [number of widgets] [baseline revision]"""
+
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import kodi
+
+# last revision without __slots__ in the model classes
+BASELINE = '175d2ea'
+
+
+def page_data(page, count):
+    widgets = []
+    for w in range(count):
+        n = page * count + w
+        widgets.append({'widgetId': '%d_%d' % (page, w), 'type': 'Text', 'icon': 'temperature',
+                        'label': 'Temperature %d [%d.5 C]' % (w, n),
+                        'item': {'name': 'Item%d' % n, 'type': 'Number', 'state': '%d.5' % n,
+                                 'link': 'http://localhost/rest/items/Item%d' % n}})
+    return {'id': 'p%d' % page, 'title': 'Page %d' % page, 'leaf': True, 'widgets': widgets,
+            'link': 'http://localhost/rest/sitemaps/demo/p%d' % page}
+
+
+def measure(lib, total):
+    """Build the model with the openhab2 module of directory lib, return bytes per widget."""
+    kodi.install()
+    sys.path.insert(0, lib)
+    import openhab2
+    oh = openhab2.Server('127.0.0.1', 8080)
+    oh.resources = {'images': 'http://localhost/icon'}
+    sitemap = openhab2.Sitemap(oh, {'name': 'demo', 'label': 'Demo', 'link': 'http://localhost/rest/sitemaps/demo'})
+    pages = [page_data(p, 50) for p in range(total // 50)]
+    gc.collect()
+    before = kodi.rss()
+    for data in pages:
+        oh.create_page_class(sitemap, data)
+    gc.collect()
+    after = kodi.rss()
+    result = (after - before) // len(oh.widgets)
+    oh.close()
+    return result
+
+
+def run(lib, total):
+    # a new process for every model, so memory freed by the previous run doesn't distort the result
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), str(total), '--lib', lib])
+    return int(output.split()[-1])
+
+
+def checkout(revision, path):
+    """Extract resources/lib of revision to path, returns the lib directory or None if git failed."""
+    try:
+        archive = subprocess.check_output(['git', '-C', kodi.ROOT, 'archive', revision, 'resources/lib'])
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    p = subprocess.Popen(['tar', '-x', '-C', path], stdin=subprocess.PIPE)
+    p.communicate(archive)
+    return os.path.join(path, 'resources', 'lib') if p.returncode == 0 else None
+
+
+def main():
+    args = sys.argv[1:]
+    if '--lib' in args:
+        # child process
+        print(measure(args[args.index('--lib') + 1], int(args[0])))
+        return
+    total = int(args[0]) if args else 20000
+    revision = args[1] if len(args) > 1 else BASELINE
+    current = run(os.path.join(kodi.ROOT, 'resources', 'lib'), total)
+    tmp = tempfile.mkdtemp()
+    try:
+        lib = checkout(revision, tmp)
+        baseline = run(lib, total) if lib is not None else None
+    finally:
+        shutil.rmtree(tmp)
+    print('%d widgets, bytes per widget (including its item):' % total)
+    if baseline is not None:
+        print('  baseline (%s): %d' % (revision, baseline))
+    else:
+        print('  baseline (%s): not available, git archive failed' % revision)
+    print('  current: %d' % current)
+    if baseline:
+        print('  reduction: %d%%' % (100 - current * 100 // baseline))
+
+
+if __name__ == '__main__':
+    main()
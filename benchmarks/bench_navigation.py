@@ -0,0 +1,56 @@
+# coding=utf-8
+"""Time until a page is usable after navigating to it, with list items built or reused from the render plan.
+
+   Shows a page with many text widgets and a small page, then navigates back and forth between them. No server
+   is needed. Usage: python benchmarks/bench_navigation.py [number of widgets]"""
+
+import sys
+import time
+import kodi
+
+kodi.install()
+sys.argv = ['default.py']
+import default      # runs the addon with a window which closes at once
+import resources.lib.menulist as menulist
+import resources.lib.openhab2 as openhab2
+from bench_memory import page_data
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    oh = openhab2.Server('127.0.0.1', 8080)
+    oh.resources = {'images': 'http://localhost/icon'}
+    sitemap = openhab2.Sitemap(oh, {'name': 'demo', 'label': 'Demo', 'link': 'http://localhost/rest/sitemaps/demo'})
+    large = oh.create_page_class(sitemap, page_data(0, count))
+    small = oh.create_page_class(sitemap, page_data(1, 5))
+
+    mw = default.MainWindow()
+    mw.oh = oh
+    mw.list = menulist.WidgetList(mw.getControl(menulist.CONTROL_ID_LIST))
+
+    def show(page):
+        mw.windowStack[:] = [mw.WindowStackEntry(page, page.widgets, page.attribs['title'])]
+        start = time.time()
+        mw.load_widgets_from_stack()
+        return time.time() - start
+
+    built = show(large)
+    reused = []
+    for _ in range(10):
+        show(small)
+        reused.append(show(large))
+    # widgets evicted after unloading are created again, the list items have to be built again
+    oh.use_pages([large])
+    large.unload()
+    oh.collect()
+    oh.create_page_class(sitemap, page_data(0, count))
+    reloaded = show(large)
+    print('%d widgets: built %.1f ms, reused %.1f ms (min of %d), after reload %.1f ms' %
+          (count, built * 1000, min(reused) * 1000, len(reused), reloaded * 1000))
+    print('pages built %(built)d, reused %(reused)d' % mw.nav_stats)
+    mw.keep_snapshot = False
+    mw.shutdown()
+
+
+if __name__ == '__main__':
+    main()
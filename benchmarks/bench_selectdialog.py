@@ -0,0 +1,41 @@
+# coding=utf-8
+"""Time to open the select dialog and number of list items created, for mappings of selection widgets and value
+   ranges of setpoint/slider widgets with 10 to 100000 entries, focused in the middle.
+
+   Usage: python benchmarks/bench_selectdialog.py"""
+
+from collections import OrderedDict
+from decimal import Decimal
+import time
+import kodi
+
+kodi.install()
+import menulist
+import selectdialog
+
+
+class BenchDialog(selectdialog.SelectDialog):
+    def doModal(self):
+        self.onInit()
+
+
+def open_dialog(*args, **kwargs):
+    # time from creating the dialog until its list is shown, like the widgets do on click
+    start = time.time()
+    d = BenchDialog(*args, **kwargs)
+    d.show()
+    return time.time() - start, len(d.listitems)
+
+
+def main():
+    for n in (10, 100, 1000, 10000, 100000):
+        mapping = OrderedDict(('S%d' % i, 'Station %d' % i) for i in range(n))
+        selections = menulist.DecimalRange(Decimal(0), Decimal(n - 1) / 10, Decimal('0.1'), True)
+        mapping_time, mapping_items = open_dialog('Selection', iter(mapping.values()), n // 2)
+        range_time, range_items = open_dialog('Setpoint', selections, n // 2, label=str)
+        print('%6d entries: mapping opened in %.2f ms with %d list items, range opened in %.2f ms with %d list items' %
+              (n, mapping_time * 1000, mapping_items, range_time * 1000, range_items))
+
+
+if __name__ == '__main__':
+    main()
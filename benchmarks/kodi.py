@@ -0,0 +1,190 @@
+# coding=utf-8
+"""Minimal stand-ins for the Kodi python modules, so the benchmarks can run outside of Kodi.
+
+   install() only adds modules which can't be imported, e.g. inside Kodi or with Kodistubs the real ones are
+   used. All GUI calls of the stand-ins are no-ops, the benchmarks measure the work done by the addon itself."""
+
+import os
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE = os.path.join(tempfile.gettempdir(), 'openhab-kodi-benchmark') + os.sep
+
+SETTINGS = {'server': '1', 'host': '127.0.0.1', 'port': '8080', 'sitemap': 'demo', 'proxy': 'none',
+            'authentication': '0', 'debug': 'false', 'prefetch_depth': '0'}
+
+
+class Monitor(object):
+    def waitForAbort(self, timeout=None):
+        time.sleep(timeout or 0)
+        return False
+
+    def abortRequested(self):
+        return False
+
+
+class Player(object):
+    def play(self, url):
+        pass
+
+
+class Addon(object):
+    def __init__(self, id=None):
+        pass
+
+    def getSetting(self, id_):
+        return SETTINGS.get(id_, '')
+
+    def setSetting(self, id_, value):
+        SETTINGS[id_] = value
+
+    def getLocalizedString(self, id_):
+        return str(id_)
+
+    def getAddonInfo(self, id_):
+        return {'path': ROOT, 'profile': PROFILE, 'id': 'script.openhab'}.get(id_, '')
+
+    def openSettings(self):
+        pass
+
+
+class ListItem(object):
+    def __init__(self, label='', *args, **kwargs):
+        self.label = label
+        self.properties = {}
+
+    def setLabel(self, label):
+        self.label = label
+
+    def getLabel(self):
+        return self.label
+
+    def setProperty(self, key, value):
+        self.properties[key.lower()] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key.lower(), '')
+
+    def select(self, selected):
+        pass
+
+
+class ControlList(object):
+    def __init__(self, id_):
+        self.id_ = id_
+        self.items = []
+        self.position = -1
+
+    def reset(self):
+        self.items = []
+        self.position = -1
+
+    def addItem(self, item):
+        self.items.append(item)
+        if self.position < 0:
+            self.position = 0
+
+    def addItems(self, items):
+        for item in items:
+            self.addItem(item)
+
+    def size(self):
+        return len(self.items)
+
+    def getSelectedPosition(self):
+        return self.position
+
+    def selectItem(self, position):
+        self.position = position
+
+    def getId(self):
+        return self.id_
+
+
+class WindowXMLDialog(object):
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, *args, **kwargs):
+        self.controls = {}
+
+    def getControl(self, id_):
+        return self.controls.setdefault(id_, ControlList(id_))
+
+    def setProperty(self, key, value):
+        pass
+
+    def setFocusId(self, id_):
+        pass
+
+    def getFocusId(self):
+        return 0
+
+    def doModal(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Dialog(object):
+    def ok(self, *args):
+        pass
+
+    def notification(self, *args, **kwargs):
+        pass
+
+    def select(self, *args):
+        return -1
+
+
+def create_modules():
+    xbmc = types.ModuleType('xbmc')
+    xbmc.LOGDEBUG, xbmc.LOGINFO, xbmc.LOGNOTICE, xbmc.LOGWARNING, xbmc.LOGERROR = range(5)
+    xbmc.log = lambda msg, level=xbmc.LOGNOTICE: None
+    xbmc.translatePath = lambda path: path
+    xbmc.getCondVisibility = lambda condition: False
+    xbmc.executebuiltin = lambda function: None
+    xbmc.Monitor = Monitor
+    xbmc.Player = Player
+
+    xbmcaddon = types.ModuleType('xbmcaddon')
+    xbmcaddon.Addon = Addon
+
+    xbmcgui = types.ModuleType('xbmcgui')
+    for name, value in [('ACTION_MOVE_LEFT', 1), ('ACTION_MOVE_RIGHT', 2), ('ACTION_MOVE_UP', 3),
+                        ('ACTION_MOVE_DOWN', 4), ('ACTION_PAGE_UP', 5), ('ACTION_PAGE_DOWN', 6),
+                        ('ACTION_PARENT_DIR', 9), ('ACTION_PREVIOUS_MENU', 10), ('ACTION_STOP', 13),
+                        ('ACTION_PLAY', 68), ('ACTION_NAV_BACK', 92), ('ACTION_CHANNEL_UP', 184),
+                        ('ACTION_CHANNEL_DOWN', 185), ('ACTION_TELETEXT_RED', 215),
+                        ('ACTION_TELETEXT_GREEN', 216), ('KEY_BUTTON_BACK', 275)]:
+        setattr(xbmcgui, name, value)
+    xbmcgui.NOTIFICATION_INFO = 'info'
+    xbmcgui.NOTIFICATION_WARNING = 'warning'
+    xbmcgui.ListItem = ListItem
+    xbmcgui.ControlList = ControlList
+    xbmcgui.WindowXMLDialog = WindowXMLDialog
+    xbmcgui.Dialog = Dialog
+    return {'xbmc': xbmc, 'xbmcaddon': xbmcaddon, 'xbmcgui': xbmcgui}
+
+
+def install():
+    """Make the addon importable: add its directories to sys.path and provide missing Kodi modules."""
+    for path in (ROOT, os.path.join(ROOT, 'resources', 'lib')):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    for name, module in create_modules().items():
+        try:
+            __import__(name)
+        except ImportError:
+            sys.modules[name] = module
+
+
+def rss():
+    """Resident set size of this process in bytes (Linux only)."""
+    import resource
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
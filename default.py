@@ -4,25 +4,67 @@ import xbmc
 import xbmcaddon
 import xbmcgui
 import sys
+import threading
+import time
 import requests
+try:    # OrderedDict is new in python 2.7
+    from collections import OrderedDict as OrderedDict
+except:
+    from resources.lib.ordereddict import OrderedDict
+import resources.lib.connect as connect
+import resources.lib.ipc as ipc
 import resources.lib.menulist as menulist
-import resources.lib.openhab1 as openhab1
-import resources.lib.openhab2 as openhab2
+import resources.lib.settings as settings
+import resources.lib.snapshot as snapshot
 from resources.lib.debugout import debugPrint
 
 ADDON = xbmcaddon.Addon()
 
+MAX_RENDER_PLANS = 8    # number of pages whose list items are kept for navigating back
 
-def getServer():
-    if ADDON.getSetting('server') == '0':  # openhab1
-        return openhab1
-    elif ADDON.getSetting('server') == '1':  # openhab2
-        return openhab2
+
+def get_render_key(widgets):
+    """Return everything the list items of widgets are built from, besides the attributes sent to the proxies.
+       Every entry is (model objects, values). The key holds the model objects, so they can't be replaced by
+       new objects with the same id() while the plan is cached."""
+    key = []
+    todo = list(reversed(widgets))
+    while todo:
+        w = todo.pop()
+        if w.type_ == 'Frame':
+            key.append(((w,), (bool(w.attribs['label']),)))
+            todo.extend(reversed(w.widgets))
+        else:
+            key.append(((w, w.item, w.page), (w.attribs.get('url'),)))
+    return key
+
+
+def same_render_key(key, other):
+    """Compare model objects of the keys by identity, a reloaded page has new objects with equal attributes."""
+    if len(key) != len(other):
+        return False
+    for (objects, values), (other_objects, other_values) in zip(key, other):
+        if len(objects) != len(other_objects) or values != other_values:
+            return False
+        for a, b in zip(objects, other_objects):
+            if a is not b:
+                return False
+    return True
+
+
+class RenderPlan(object):
+    """List items of a page, they stay assigned to the widgets and receive all changes while cached."""
+    def __init__(self, page, key):
+        self.page = page
+        self.key = key
+        self.items = []         # menulist.ListItem* in list order
+        self.linked_pages = []  # (list position, page) of all linked pages
 
 
 class MainWindow(menulist.MainWindow):
     class WindowStackEntry(object):
-        def __init__(self, widgets, title, position=None):
+        def __init__(self, page, widgets, title, position=None):
+            self.page = page
             self.widgets = widgets
             self.title = title
             self.position = position
@@ -32,59 +74,171 @@ class MainWindow(menulist.MainWindow):
         self.windowStack = []
         self.oh = None
         self.homepage = None
+        self.linked_pages = []  # (list position, page) of all linked pages of the visible page
+        self.render_plans = OrderedDict()   # page id -> RenderPlan, least recently used first
+        self.nav_stats = {'built': 0, 'reused': 0, 'built_time': 0.0, 'reused_time': 0.0}
+        self.keep_snapshot = True   # False = snapshot doesn't match the server any more, don't save it again
+        self.snapshot_key = None    # server and sitemap of the connection settings the window was opened with
+        settings.callbacks.append(self.settings_changed)
+        self.closed = threading.Event()
+        t = threading.Thread(target=self.abort_watcher)
+        t.daemon = True
+        t.start()
+
+    def abort_watcher(self):
+        # close window if Kodi is shutting down
+        monitor = xbmc.Monitor()
+        while not self.closed.is_set():
+            if monitor.waitForAbort(1):
+                self.close()
+                return
+
+    def shutdown(self):
+        """Stop all threads and release all connections after the window was closed."""
+        self.closed.set()
+        settings.callbacks.remove(self.settings_changed)
+        self.render_plans.clear()
+        n = self.nav_stats
+        debugPrint(5, 'shutdown: %d pages built (avg %.3fs), %d reused (avg %.3fs)',
+                   n['built'], n['built_time'] / n['built'] if n['built'] else 0.0,
+                   n['reused'], n['reused_time'] / n['reused'] if n['reused'] else 0.0)
+        if self.list is not None:
+            n = self.list.stats
+            if n['progressive']:
+                debugPrint(5, 'shutdown: %d pages shown progressively, usable after avg %.3fs, complete after avg %.3fs',
+                           n['progressive'], n['first_time'] / n['progressive'], n['complete_time'] / n['progressive'])
+        menulist.UPDATE_QUEUE.close()
+        stats = menulist.UPDATE_QUEUE.get_stats()
+        debugPrint(5, 'shutdown: %d updates received, %d applied in %d batches, latency avg %.3fs max %.3fs',
+                   stats['received'], stats['applied'], stats['batches'], stats['latency_avg'], stats['latency_max'])
+        if self.oh is not None and self.windowStack and self.keep_snapshot:
+            # save on every exit, e.g. back key, connection lost, Kodi shutdown or showing an image
+            self.save_snapshot()
+        if self.oh is not None:
+            result = self.oh.close()
+            if result['threads'] or result['connections']:
+                debugPrint(1, 'shutdown: %d threads and %d connections still alive' %
+                           (result['threads'], result['connections']))
 
     def build_menu(self):
-        self.oh = getServer().Server(ADDON.getSetting('host'), ADDON.getSetting('port'))
+        s = settings.get()
+        self.oh = connect.create_server(s)
+        # connection settings changed while the window is open are applied on next start
+        # ==> the model always belongs to this key
+        self.snapshot_key = connect.get_snapshot_key(s)
         self.oh.terminate_callback.append(lambda oh: self.connection_lost())
+        self.oh.dispatcher.callbacks.append(self.command_done)
+        self.oh.breaker.callbacks.append(self.connection_state_changed)
+        self.oh.resume = s.reconnect
+        self.oh.prefetcher.depth = s.prefetch_depth
 
         #if ADDON.getSetting('auto_update') == 'true':
         self.oh.poll_pages = True       # always enable auto-update
 
-        if ADDON.getSetting('authentication') == '1':
-            self.oh.set_basic_auth(ADDON.getSetting('auth_basic_username'), ADDON.getSetting('auth_basic_password'))
+        data = self.get_service_snapshot(s)
+        if data is None:
+            data = snapshot.load(connect.SNAPSHOT_PATH, self.snapshot_key)
+        if data is not None:
+            # show last known state immediately and revalidate in background
+            sitemap = self.oh.restore_snapshot(data)
+            self.homepage = sitemap.page
+            self.homepage.needs_catch_up = False    # fetched by revalidate
+            t = threading.Thread(target=self.revalidate, args=(sitemap,))
+            t.daemon = True
+            t.start()
+        else:
+            try:
+                self.oh.load_sitemaps()
+                try:
+                    sitemap = self.oh.sitemaps[s.sitemap]
+                except KeyError:
+                    # invalid sitemap -> close window immediately
+                    debugPrint(1, "build_menu failed, host=%s, port=%s, auth=%s, sitemap=%s sitemaps=%s" %
+                           (s.host, s.port, s.authentication, s.sitemap, self.oh.sitemaps))
+                    xbmcgui.Dialog().ok(ADDON.getLocalizedString(30007), ADDON.getLocalizedString(30206))
+                    self.close()
+                    ADDON.openSettings()
+                    return
+                self.homepage = sitemap.load_page()
+            except requests.exceptions.RequestException as e:
+                # no connection to openhab server -> close window immediately
+                debugPrint(1, "build_menu failed, host=%s, port=%s, auth=%s, e=%s" %
+                       (s.host, s.port, s.authentication, repr(e)))
+                xbmcgui.Dialog().ok(ADDON.getLocalizedString(30007), ADDON.getLocalizedString(30201))
+                self.close()
+                ADDON.openSettings()
+                return
+
+        if s.server == '1':    # openhab2 only
+            if s.event_stream:
+                self.oh.start_event_stream()
+            if s.sitemap_subscription:
+                self.oh.start_sitemap_subscription(sitemap)
+        self.enter_sub_menu(self.homepage)
 
-        PROXY_MAP = {'0': 'system', '1': 'none'}
-        self.oh.set_proxy(PROXY_MAP[ADDON.getSetting('proxy')])
+    def get_service_snapshot(self, s):
+        # snapshot of the model kept up to date by the background service, if running. It's fresher than the
+        # snapshot file, but like that it's only used for the first paint, the window still connects itself.
+        if not s.service:
+            return None
+        response = ipc.request(connect.SERVICE_PATH, {'cmd': 'snapshot', 'key': connect.get_snapshot_key(s)},
+                               connect.SERVICE_TIMEOUT)
+        if response is None:
+            return None
+        return response.get('data')
 
+    def revalidate(self, sitemap):
+        # fetch homepage, changes are applied to the already shown widgets
         try:
-            self.oh.load_sitemaps()
-            try:
-                sitemap = self.oh.sitemaps[ADDON.getSetting('sitemap')]
-            except KeyError:
-                # invalid sitemap -> close window immediately
-                debugPrint(1, "build_menu failed, host=%s, port=%s, auth=%s, sitemap=%s sitemaps=%s" %
-                       (ADDON.getSetting('host'), ADDON.getSetting('port'),
-                        ADDON.getSetting('authentication'), ADDON.getSetting('sitemap'), self.oh.sitemaps))
+            sitemap.load_page()
+        except requests.exceptions.HTTPError as e:
+            debugPrint(1, "revalidate failed, host=%s, port=%s, e=%s" % (self.oh.host, self.oh.port, repr(e)))
+            if e.response is not None and e.response.status_code == 404:
+                # sitemap was deleted or renamed => shown snapshot is invalid
+                self.keep_snapshot = False
+                snapshot.remove(connect.SNAPSHOT_PATH)
                 xbmcgui.Dialog().ok(ADDON.getLocalizedString(30007), ADDON.getLocalizedString(30206))
                 self.close()
                 ADDON.openSettings()
-            self.homepage = sitemap.load_page()
+            else:
+                self.oh.connection_lost()
         except requests.exceptions.RequestException as e:
-            # no connection to openhab server -> close window immediately
-            debugPrint(1, "build_menu failed, host=%s, port=%s, auth=%s, e=%s" %
-                   (ADDON.getSetting('host'), ADDON.getSetting('port'),
-                    ADDON.getSetting('authentication'), repr(e)))
-            xbmcgui.Dialog().ok(ADDON.getLocalizedString(30007), ADDON.getLocalizedString(30201))
-            self.close()
-            ADDON.openSettings()
-        self.enter_sub_menu(self.homepage)
+            debugPrint(1, "revalidate failed, host=%s, port=%s, e=%s" % (self.oh.host, self.oh.port, repr(e)))
+            self.oh.connection_lost()
+
+    def save_snapshot(self):
+        sitemap = self.windowStack[0].page.sitemap
+        snapshot.save(connect.SNAPSHOT_PATH, self.snapshot_key, self.oh.get_snapshot(sitemap))
 
     def enter_sub_menu(self, page):
+        if page.raw is None:
+            # widgets of the page were unloaded to save memory
+            try:
+                page.get_page()
+                page.needs_catch_up = False
+            except requests.exceptions.RequestException as e:
+                debugPrint(1, 'enter_sub_menu: %s for page %s' % (repr(e), page.id_))
+                self.oh.connection_lost()
+                return
         # store current focus position
         if self.windowStack:
             self.windowStack[-1].position = self.list.get_selected_position()
         # add new page to stack
-        self.windowStack.append(self.WindowStackEntry(page.widgets, page.attribs['title'], None))
+        self.windowStack.append(self.WindowStackEntry(page, page.widgets, page.attribs['title'], None))
+        self.oh.prefetcher.visited(page)
         # open last entry on stack
         self.load_widgets_from_stack()
+        self.update_poll_pages()
+        self.prefetch_linked_pages()
 
     def load_widgets_from_stack(self):
+        start = time.time()
         # get last entry on window stack
         e = self.windowStack[-1]
-        # clear list control
-        self.list.reset()
-        # load all widgets
-        self.load_widgets(e.widgets)
+        # show list items of the page, reuse them if the page was shown before
+        plan, reused = self.get_render_plan(e.page, e.widgets)
+        self.list.set_items(plan.items, e.position)
+        self.linked_pages[:] = plan.linked_pages
         # recover last focus position before opening submenu
         if e.position is not None:
             self.list.select_item(e.position)
@@ -93,7 +247,26 @@ class MainWindow(menulist.MainWindow):
         # set breadcrumb as title
         self.setProperty('title', ' > '.join([x.title for x in self.windowStack]))
 
-    def load_widgets(self, widgets):
+        duration = time.time() - start
+        kind = 'reused' if reused else 'built'
+        self.nav_stats[kind] += 1
+        self.nav_stats[kind + '_time'] += duration
+        debugPrint(5, 'page %s usable after %.3fs, %d list items %s', e.page.id_, duration, len(plan.items), kind)
+
+    def get_render_plan(self, page, widgets):
+        """Return (plan, reused). Cached list items are still assigned to the widgets and up to date."""
+        key = get_render_key(widgets)
+        plan = self.render_plans.pop(page.id_, None)
+        reused = plan is not None and plan.page is page and same_render_key(plan.key, key)
+        if not reused:
+            plan = RenderPlan(page, key)
+            self.load_widgets(widgets, plan)
+        self.render_plans[page.id_] = plan
+        while len(self.render_plans) > MAX_RENDER_PLANS:
+            self.render_plans.popitem(last=False)   # proxies of the dropped items are pruned by the model
+        return plan, reused
+
+    def load_widgets(self, widgets, plan):
         for w in widgets:
             li = None
             subordinate_widgets = None
@@ -112,6 +285,7 @@ class MainWindow(menulist.MainWindow):
                 if w.page is not None:
                     li.subscribe(lambda control, page=w.page: self.enter_sub_menu(page))
                     li.set_show_next_icon(True)
+                    plan.linked_pages.append((len(plan.items), w.page))
             elif w.type_ == 'Image':
                 li = menulist.ListItemLabel()
                 li.subscribe(lambda control, url=w.attribs['url']: self.show_image(url))
@@ -143,6 +317,7 @@ class MainWindow(menulist.MainWindow):
                 if w.page is not None:
                     li.subscribe(lambda control, page=w.page: self.enter_sub_menu(page))
                     li.set_show_next_icon(True)
+                    plan.linked_pages.append((len(plan.items), w.page))
             elif w.type_ == 'Video':
                 li = menulist.ListItemLabel()
                 li.subscribe(lambda control, url=w.attribs['url']: self.show_video(url))
@@ -156,22 +331,28 @@ class MainWindow(menulist.MainWindow):
                 continue
 
             if li is not None:
-                self.list.add_item(li)
+                plan.items.append(li)
                 w.set_proxy(li)
-            else:
-                self.list.add_separator_line_to_last_item()
+            elif plan.items:
+                plan.items[-1].set_separator_line(True)
 
             if subordinate_widgets:
-                self.load_widgets(subordinate_widgets)
+                self.load_widgets(subordinate_widgets, plan)
 
     def go_back(self):
         if len(self.windowStack) <= 1:
-            # no more widgets on the stack => close the window
-            self.oh.alive = False
+            # no more widgets on the stack => close the window, the snapshot is saved by shutdown
+            self.oh.alive = False   # remaining threads are stopped by shutdown
             self.close()
         else:
             self.windowStack.pop()
             self.load_widgets_from_stack()
+            self.update_poll_pages()
+            self.prefetch_linked_pages()
+
+    def update_poll_pages(self):
+        # update only the pages on the window stack
+        self.oh.set_visible_pages([e.page for e in self.windowStack])
 
     def connection_lost(self):
         xbmcgui.Dialog().notification(ADDON.getLocalizedString(30007),
@@ -179,6 +360,31 @@ class MainWindow(menulist.MainWindow):
                                       xbmcgui.NOTIFICATION_WARNING)
         self.close()
 
+    def prefetch_linked_pages(self):
+        # prefetch linked pages, nearest to the cursor first
+        self.oh.prefetcher.schedule(self.linked_pages, self.list.get_selected_position())
+
+    def onAction(self, action):
+        super(MainWindow, self).onAction(action)
+        if action.getId() in menulist.FOCUS_CHANGED_CODES and self.oh is not None and self.oh.alive:
+            self.prefetch_linked_pages()
+
+    def connection_state_changed(self, state):
+        # show reconnecting status while the openHAB server is not reachable
+        self.setProperty('status', ADDON.getLocalizedString(30208) if state != 'closed' else '')
+
+    def settings_changed(self, old, new):
+        # connection settings are applied on next start, all others immediately
+        if self.oh is not None:
+            self.oh.resume = new.reconnect
+            self.oh.prefetcher.depth = new.prefetch_depth
+
+    def command_done(self, item, value, error):
+        if error is not None:
+            xbmcgui.Dialog().notification(ADDON.getLocalizedString(30007),
+                                          ADDON.getLocalizedString(30207) % (value, item.name),
+                                          xbmcgui.NOTIFICATION_WARNING)
+
     def show_image(self, url):
         self.close()
         xbmc.executebuiltin('ShowPicture(%s)' % url)
@@ -190,19 +396,14 @@ class MainWindow(menulist.MainWindow):
 
 def show_sitemaps():
     # show sitemap selection dialog instead of main window if called from settings dialog
-    oh = getServer().Server(ADDON.getSetting('host'), ADDON.getSetting('port'))
-    if ADDON.getSetting('authentication') == '1':
-        oh.set_basic_auth(ADDON.getSetting('auth_basic_username'), ADDON.getSetting('auth_basic_password'))
-
-    PROXY_MAP = {'0': 'system', '1': 'none'}
-    oh.set_proxy(PROXY_MAP[ADDON.getSetting('proxy')])
+    s = settings.get()
+    oh = connect.create_server(s)
 
     try:
         sitemaps = sorted(oh.load_sitemaps().iterkeys())
     except requests.exceptions.RequestException as e:
         debugPrint(1, "show_sitemaps failed, host=%s, port=%s, auth=%s, e=%s" %
-                   (ADDON.getSetting('host'), ADDON.getSetting('port'),
-                    ADDON.getSetting('authentication'), repr(e)))
+                   (s.host, s.port, s.authentication, repr(e)))
         xbmcgui.Dialog().ok(ADDON.getLocalizedString(30007), ADDON.getLocalizedString(30008))
         return
 
@@ -216,4 +417,5 @@ if 'show_sitemaps' in sys.argv:
 else:
     mw = MainWindow()
     mw.doModal()
+    mw.shutdown()
     del mw
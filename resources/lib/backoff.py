@@ -0,0 +1,90 @@
+# coding=utf-8
+
+import random
+import threading
+import time
+from debugout import debugPrint
+
+CLOSED = 'closed'           # server reachable, requests are sent immediately
+OPEN = 'open'               # server not reachable, requests are delayed
+HALF_OPEN = 'half-open'     # one probe request is sent to test if the server is reachable again
+
+
+class CircuitBreaker(object):
+    """Circuit breaker with exponential backoff shared by all threads talking to the same server.
+
+       Every failure opens the breaker for a jittered, exponentially growing delay. After the delay one
+       thread is allowed to send a probe request (half-open), all other threads keep waiting. If the
+       probe succeeds the breaker closes, otherwise it opens again with a longer delay.
+       Callbacks are called with the new state on every state change."""
+
+    def __init__(self, alive, base=0.5, cap=60.0):
+        self.alive = alive      # function returning False if waiting threads shall give up
+        self.base = base        # delay after first failure [s]
+        self.cap = cap          # maximum delay [s]
+        self.cond = threading.Condition()
+        self.state = CLOSED
+        self.failures = 0       # number of consecutive failures
+        self.retry_at = 0       # time when the next probe request is allowed
+        self.probing = False    # True = a probe request is in flight
+        self.prober = None      # thread sending the probe request
+        self.callbacks = []
+
+    def get_delay(self):
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.cap, self.base * 2 ** self.failures))
+
+    def before_request(self):
+        """Block until a request may be sent. Returns True if the caller shall send a probe request."""
+        with self.cond:
+            while self.alive():
+                if self.state == CLOSED:
+                    return False
+                now = time.time()
+                if self.state == OPEN and now >= self.retry_at:
+                    self.set_state(HALF_OPEN)
+                if self.state == HALF_OPEN and not self.probing:
+                    self.probing = True
+                    self.prober = threading.current_thread()
+                    return True
+                # wait in small steps to recognize if the server connection was closed in the meantime
+                timeout = self.retry_at - now if self.state == OPEN else 1.0
+                self.cond.wait(min(max(timeout, 0.01), 1.0))
+            return False
+
+    def record_success(self):
+        with self.cond:
+            self.failures = 0
+            self.probing = False
+            self.prober = None
+            if self.state != CLOSED:
+                self.set_state(CLOSED)
+
+    def record_failure(self):
+        with self.cond:
+            if self.state == OPEN:
+                return      # failure of a request sent before the breaker opened
+            delay = self.get_delay()
+            self.failures += 1
+            self.probing = False
+            self.prober = None
+            self.retry_at = time.time() + delay
+            debugPrint(1, 'CircuitBreaker: failure %d, retry in %.1fs' % (self.failures, delay))
+            self.set_state(OPEN)
+
+    def release_probe(self):
+        """Must be called by every thread which got a probe request from before_request, after the request
+           finished. If neither success nor failure was recorded (e.g. the request timed out or failed
+           unexpectedly), the next waiting thread may send a probe request."""
+        with self.cond:
+            if self.probing and self.prober is threading.current_thread():
+                self.probing = False
+                self.prober = None
+                self.cond.notify_all()
+
+    def set_state(self, state):
+        # must be called with acquired lock, callbacks must not block
+        self.state = state
+        self.cond.notify_all()
+        for cb in self.callbacks:
+            cb(state)
@@ -0,0 +1,153 @@
+# coding=utf-8
+
+import collections
+import threading
+import time
+from debugout import debugPrint
+
+
+class CommandRejectedError(Exception):
+    """Base class for commands which were not sent to openHAB at all, the item state is unchanged"""
+    pass
+
+
+class QueueFullError(CommandRejectedError):
+    """Exception for commands which can't be queued because too many commands are pending"""
+    pass
+
+
+class DispatcherClosedError(CommandRejectedError):
+    """Exception for commands which are not sent because the dispatcher was closed"""
+    pass
+
+
+class Command(object):
+    def __init__(self, item, value, prev_state, coalesce):
+        self.item = item
+        self.value = value
+        self.prev_state = prev_state    # item state before the command was issued
+        self.coalesce = coalesce        # True = command may be replaced by a newer command
+
+
+class CommandDispatcher(object):
+    """Send item commands to openHAB in background threads, so the UI never waits for the server.
+
+       Commands of the same item are delivered in order, there is at most one command per item in
+       flight. The number of pending commands is bounded. After a command was sent (or failed) the
+       item's command_done function and all registered callbacks are called with (item, value, error).
+
+       Commands submitted with coalesce=True are latest-wins: if the previous command of the item is
+       still pending and also coalescable, its value is replaced instead of queuing another command.
+       This keeps rapid input (e.g. key repeat on a setpoint) at one command in flight and one pending."""
+
+    def __init__(self, workers=2, maxsize=64):
+        self.cond = threading.Condition()
+        self.workers = workers
+        self.maxsize = maxsize
+        self.threads = []
+        self.queues = {}        # item name -> deque of pending commands
+        self.ready = collections.deque()    # names of items with pending commands, but nothing in flight
+        self.count = 0          # number of pending + in flight commands
+        self.sent = 0           # number of commands sent to openHAB
+        self.dropped = 0        # number of commands replaced by a newer command
+        self.failed = 0         # number of failed or rejected commands
+        self.closed = False
+        self.callbacks = []
+
+    def submit(self, item, value, prev_state, coalesce=False):
+        """Queue command for item, returns immediately."""
+        cmd = Command(item, value, prev_state, coalesce)
+        with self.cond:
+            q = self.queues.get(item.name)
+            if coalesce and q and q[-1].coalesce:
+                # replace pending command, keep state before the replaced command for reconciliation
+                q[-1].value = value
+                self.dropped += 1
+                return
+            if self.closed:
+                error = DispatcherClosedError()
+            elif self.count >= self.maxsize:
+                error = QueueFullError()
+            else:
+                error = None
+                self.count += 1
+                if item.name in self.queues:
+                    self.queues[item.name].append(cmd)    # command in flight => deliver afterwards
+                else:
+                    self.queues[item.name] = collections.deque([cmd])
+                    self.ready.append(item.name)
+                    self.cond.notify_all()  # close may wait on cond, too
+                if len(self.threads) < self.workers:
+                    t = threading.Thread(target=self.worker_thread)
+                    t.daemon = True
+                    self.threads.append(t)
+                    t.start()
+        if error is not None:
+            debugPrint(1, 'CommandDispatcher: %s, dropped command %s for item %s' % (repr(error), value, item.name))
+            self.done(cmd, error)
+
+    def pending(self, item):
+        """Return number of pending commands for item (not yet sent)."""
+        with self.cond:
+            q = self.queues.get(item.name)
+            return len(q) if q else 0
+
+    def worker_thread(self):
+        while True:
+            with self.cond:
+                while not self.ready and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                name = self.ready.popleft()
+                cmd = self.queues[name].popleft()
+
+            try:
+                cmd.item.send_command_blocked(cmd.value)
+                error = None
+            except Exception as e:
+                error = e
+
+            with self.cond:
+                self.count -= 1
+                if error is None:
+                    self.sent += 1
+                if self.count == 0:
+                    self.cond.notify_all()  # wake up close
+                if self.queues[name]:
+                    if error is not None:
+                        # the failed command didn't change the item, the next one starts from the same state
+                        self.queues[name][0].prev_state = cmd.prev_state
+                    self.ready.append(name)
+                    self.cond.notify_all()  # close may wait on cond, too
+                else:
+                    del self.queues[name]
+
+            self.done(cmd, error)
+
+    def close(self, timeout):
+        """Wait up to timeout seconds until all pending commands are sent, then stop all worker threads.
+           Commands still pending are dropped."""
+        deadline = time.time() + timeout
+        with self.cond:
+            while self.count > 0 and time.time() < deadline:
+                self.cond.wait(deadline - time.time())
+            self.closed = True
+            dropped = sum([len(q) for q in self.queues.values()])
+            self.cond.notify_all()
+        if dropped:
+            debugPrint(1, 'CommandDispatcher: closed, %d commands not sent' % dropped)
+
+    def get_stats(self):
+        with self.cond:
+            return {'pending': self.count, 'sent': self.sent, 'dropped': self.dropped, 'failed': self.failed}
+
+    def done(self, cmd, error):
+        if error is not None:
+            with self.cond:
+                self.failed += 1
+            debugPrint(1, 'CommandDispatcher: command %s for item %s failed: %s' %
+                       (cmd.value, cmd.item.name, repr(error)))
+        cmd.item.command_done(cmd, error)
+        for cb in self.callbacks:
+            cb(cmd.item, cmd.value, error)
@@ -0,0 +1,37 @@
+# coding=utf-8
+
+import os
+import xbmc
+import xbmcaddon
+import openhab1
+import openhab2
+
+ADDON = xbmcaddon.Addon()
+PROFILE = xbmc.translatePath(ADDON.getAddonInfo('profile'))
+SNAPSHOT_PATH = os.path.join(PROFILE, 'snapshot.dat')
+SERVICE_PATH = os.path.join(PROFILE, 'service.sock')    # ipc socket of the background service
+# the window asks the service while starting, a hung service must not delay the start noticeably
+SERVICE_TIMEOUT = 0.25  # [s]
+
+
+def getServer(s):
+    if s.server == '0':  # openhab1
+        return openhab1
+    elif s.server == '1':  # openhab2
+        return openhab2
+
+
+def create_server(s):
+    """Create server for the settings snapshot s."""
+    oh = getServer(s).Server(s.host, s.port)
+    if s.authentication == '1':
+        oh.set_basic_auth(s.auth_basic_username, s.auth_basic_password)
+
+    PROXY_MAP = {'0': 'system', '1': 'none'}
+    oh.set_proxy(PROXY_MAP[s.proxy])
+    return oh
+
+
+def get_snapshot_key(s):
+    """Snapshots are only valid for the server and sitemap they were taken from."""
+    return [s.server, s.host, s.port, s.sitemap]
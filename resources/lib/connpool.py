@@ -0,0 +1,161 @@
+# coding=utf-8
+
+import socket
+import threading
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+from debugout import debugPrint
+
+
+def adapter_stats(adapter):
+    """Return number of opened connections and number of served requests of all connection pools
+       of the given adapter."""
+    connections = 0
+    served = 0
+    for key in adapter.poolmanager.pools.keys():
+        pool = adapter.poolmanager.pools.get(key)
+        if pool is not None:
+            connections += pool.num_connections
+            served += pool.num_requests
+    return connections, served
+
+
+def shutdown_socket(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+        pass
+
+
+def abort_response(resp):
+    """Close a streamed response from another thread. Closing the response alone doesn't wake up a
+       thread blocked in reading the stream, therefore the socket is shut down first."""
+    conn = getattr(resp.raw, '_connection', None)
+    sock = getattr(conn, 'sock', None)
+    if sock is not None:
+        shutdown_socket(sock)
+    resp.close()
+
+
+def tracked_connection_class(cls, pool):
+    class TrackedConnection(cls):
+        def connect(self):
+            cls.connect(self)
+            pool.register(self)
+    return TrackedConnection
+
+
+class TrackingAdapter(HTTPAdapter):
+    """HTTPAdapter which registers every connection it opens at the SessionPool, so in-flight requests
+       can be aborted from another thread."""
+
+    def __init__(self, pool, **kwargs):
+        self.pool = pool
+        super(TrackingAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TrackingAdapter, self).init_poolmanager(*args, **kwargs)
+        new_pool = self.poolmanager._new_pool
+        classes = {}
+
+        def _new_pool(*args, **kwargs):
+            p = new_pool(*args, **kwargs)
+            cls = p.ConnectionCls
+            if cls not in classes:
+                classes[cls] = tracked_connection_class(cls, self.pool)
+            p.ConnectionCls = classes[cls]
+            return p
+
+        self.poolmanager._new_pool = _new_pool
+
+
+class SessionPool(object):
+    """Keep-alive HTTP connection pool shared by all REST requests of a server instance.
+
+       All requests go through one requests.Session, so TCP connections are reused instead of opening
+       a new connection for every fetch, long-poll and command. The pool size follows the number of
+       concurrently running poll threads (see ensure_capacity).
+
+       close aborts all requests in flight, even long-polls blocked in waiting for the response."""
+
+    def __init__(self, maxsize=4):
+        self.lock = threading.Lock()
+        self.maxsize = 0
+        self.requests = 0       # number of requests sent through this pool
+        self.retired = (0, 0)   # (connections, requests) counted by already replaced adapters
+        self.connections = weakref.WeakSet()    # all opened connections
+        self.closed = False
+        self.session = requests.Session()
+        self.ensure_capacity(maxsize)
+
+    def ensure_capacity(self, size):
+        """Grow the connection pool to hold at least size keep-alive connections per host."""
+        with self.lock:
+            if size <= self.maxsize:
+                return
+            # at least double the size to avoid replacing the adapter for every new poll thread
+            self.maxsize = max(size, 2 * self.maxsize)
+            old = self.session.adapters.get('http://')
+            if isinstance(old, HTTPAdapter):
+                connections, served = adapter_stats(old)
+                self.retired = (self.retired[0] + connections, self.retired[1] + served)
+            adapter = TrackingAdapter(self, pool_connections=2, pool_maxsize=self.maxsize)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            debugPrint(5, 'SessionPool: pool size set to %d', self.maxsize)
+
+    def register(self, conn):
+        with self.lock:
+            self.connections.add(conn)
+            closed = self.closed
+        if closed:
+            shutdown_socket(conn.sock)  # opened while closing
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            if self.closed:
+                raise requests.exceptions.ConnectionError('session pool closed')
+            self.requests += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def get_stats(self):
+        """Return pool counters:
+           requests: number of requests sent
+           misses: number of requests which needed a new TCP connection
+           hits: number of requests served by an already open keep-alive connection
+           reuse: ratio of hits to requests"""
+        misses, served = adapter_stats(self.session.adapters['http://'])
+        misses += self.retired[0]
+        served += self.retired[1]
+        hits = max(served - misses, 0)
+        return {'requests': self.requests,
+                'misses': misses,
+                'hits': hits,
+                'reuse': float(hits) / served if served else 0.0,
+                'maxsize': self.maxsize}
+
+    def open_connections(self):
+        """Return number of connections with an open socket."""
+        with self.lock:
+            return len([c for c in self.connections if c.sock is not None])
+
+    def close(self):
+        """Close idle connections and abort all requests in flight. Further requests fail."""
+        with self.lock:
+            self.closed = True
+            connections = list(self.connections)
+        for conn in connections:
+            sock = conn.sock
+            if sock is not None:
+                shutdown_socket(sock)
+        self.session.close()
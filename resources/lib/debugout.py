@@ -1,13 +1,40 @@
 # coding=utf-8
 
 import xbmc
-import xbmcaddon
+import settings
 
-ADDON = xbmcaddon.Addon()
+MAX_ARG_LENGTH = 1024   # longer string arguments (e.g. response bodies) are truncated
 
+_kodi_debug = None      # cached debug setting of Kodi, LOGDEBUG messages are dropped if False
 
-def debugPrint(level, msg):
-    msg = unicode(msg)
+
+def refresh(old=None, new=None):
+    """Read the debug setting of Kodi again. Called on start and if the addon settings have changed."""
+    global _kodi_debug
+    _kodi_debug = bool(xbmc.getCondVisibility('System.GetBool(debug.showloginfo)'))
+
+
+settings.callbacks.append(refresh)
+
+
+def debugEnabled(level):
+    """Return True if messages of level are written to the log. Guard expensive arguments with it."""
+    if level < 5:
+        return True
+    if _kodi_debug is None:
+        refresh()
+    return settings.get().debug or _kodi_debug
+
+
+def truncate(arg):
+    if isinstance(arg, basestring) and len(arg) > MAX_ARG_LENGTH:
+        return arg[:MAX_ARG_LENGTH] + '... (%d chars)' % len(arg)
+    return arg
+
+
+def debugPrint(level, msg, *args):
+    """Write msg to the Kodi log. If args are given, msg is formatted with them only if the message
+       is written, so callers can pass arguments instead of formatting msg themselves."""
     if level == 0:
         level = xbmc.LOGERROR
     elif level < 3:
@@ -15,8 +42,15 @@ def debugPrint(level, msg):
     elif level < 5:
         level = xbmc.LOGNOTICE
     else:
-        if ADDON.getSetting('debug') == 'true':
+        if _kodi_debug is None:
+            refresh()
+        if settings.get().debug:
             level = xbmc.LOGNOTICE
-        else:
+        elif _kodi_debug:
             level = xbmc.LOGDEBUG
-    xbmc.log(u"{0}".format(msg).encode('ascii', 'xmlcharrefreplace'), level)
\ No newline at end of file
+        else:
+            return  # would be dropped by Kodi anyway
+    if args:
+        msg = msg % tuple([truncate(arg) for arg in args])
+    msg = unicode(msg)
+    xbmc.log(u"{0}".format(msg).encode('ascii', 'xmlcharrefreplace'), level)
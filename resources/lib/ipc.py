@@ -0,0 +1,94 @@
+# coding=utf-8
+
+import json
+import os
+import socket
+import threading
+from debugout import debugPrint
+
+
+def available():
+    return hasattr(socket, 'AF_UNIX')
+
+
+class IpcServer(object):
+    """Serve requests of other processes over a Unix socket.
+
+       Every connection carries one request and one response, both encoded as a single line of json.
+       handler is called with the decoded request and returns the response."""
+
+    def __init__(self, path, handler):
+        self.path = path
+        self.handler = handler
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.exists(self.path):
+            os.remove(self.path)    # left over by a crashed service
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(4)
+        self.thread = threading.Thread(target=self.accept_thread)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        self.sock = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def accept_thread(self):
+        sock = self.sock
+        while self.sock is sock:
+            try:
+                conn, addr = sock.accept()
+            except socket.error:
+                return      # socket closed
+            t = threading.Thread(target=self.serve, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def serve(self, conn):
+        try:
+            f = conn.makefile('rwb')
+            response = self.handler(json.loads(f.readline()))
+            f.write(json.dumps(response, separators=(',', ':')) + '\n')
+            f.flush()
+            f.close()
+        except (socket.error, ValueError, TypeError) as e:
+            debugPrint(1, 'IpcServer: %s' % repr(e))
+        finally:
+            conn.close()
+
+
+def request(path, msg, timeout=2.0):
+    """Send msg to the IpcServer listening on path. Returns the response or None if the request failed,
+       e.g. because no server is running."""
+    if not available() or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        f = sock.makefile('rwb')
+        f.write(json.dumps(msg, separators=(',', ':')) + '\n')
+        f.flush()
+        return json.loads(f.readline())
+    except (socket.error, ValueError) as e:
+        debugPrint(5, 'ipc request failed, path=%s, e=%s', path, repr(e))
+        return None
+    finally:
+        sock.close()
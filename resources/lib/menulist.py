@@ -2,12 +2,15 @@
 
 import xbmcaddon
 import xbmcgui
+import threading
+import time
 import weakref
 from selectdialog import SelectDialog
 from colorpicker import ColorPicker
 from colorutils import hsv_degree_to_rgb_hex_str, rgb_hex_str_to_hsv_degree
 from htmlcolors import HTML_COLORS
 from debugout import debugPrint
+from uiqueue import UpdateQueue
 
 ADDON = xbmcaddon.Addon()
 
@@ -25,13 +28,65 @@ FOCUS_CHANGED_CODES = {xbmcgui.ACTION_MOVE_RIGHT: 1,
                        xbmcgui.ACTION_MOVE_UP: -1,
                        xbmcgui.ACTION_MOVE_DOWN: 1}
 
+# rows of the list control visible at once (menulist.xml: list height / item height)
+VISIBLE_ROWS = 13
+# large pages are shown progressively: rows added before the list gets the focus and rows added per tick
+FIRST_CHUNK_ROWS = 2 * VISIBLE_ROWS
+CHUNK_ROWS = 4 * VISIBLE_ROWS
+CHUNK_TICK = 0.02   # [s]
 
-# range function with Decimal (and float) support
-def drange(start, stop, step):
-    r = start
-    while r <= stop:
-        yield r
-        r += step
+# changes of the model are applied to the list items in batches
+UPDATE_QUEUE = UpdateQueue()
+
+
+class DecimalRange(object):
+    """Read-only sequence start, start + step, ... up to stop (inclusive) with Decimal (and float) support,
+       in descending order if reverse is True. Values are computed on access, index and item access are O(1),
+       slices return a list of the selected values only."""
+
+    def __init__(self, start, stop, step, reverse=False):
+        self.start = start
+        self.step = step
+        self.reverse = reverse
+        if step > 0 and stop >= start:
+            self.length = int((stop - start) // step) + 1
+        else:
+            self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('DecimalRange index out of range')
+        if self.reverse:
+            index = self.length - 1 - index
+        return self.start + index * self.step
+
+    def __iter__(self):
+        i = 0
+        while i < self.length:
+            yield self[i]
+            i += 1
+
+    def index(self, value):
+        try:
+            (n, remainder) = divmod(value - self.start, self.step)
+        except (TypeError, ArithmeticError):
+            raise ValueError('%r is not in DecimalRange' % value)
+        if remainder != 0 or not 0 <= n < self.length:
+            raise ValueError('%r is not in DecimalRange' % value)
+        n = int(n)
+        return self.length - 1 - n if self.reverse else n
+
+
+def get_range_selections(attribs):
+    # selectable values of setpoint and slider widgets, highest value first
+    return DecimalRange(attribs['widget_min_value'], attribs['widget_max_value'], attribs['widget_step'], True)
 
 
 def get_item_index(array, element):
@@ -62,6 +117,7 @@ class ListItem(object):
     def __init__(self, typ, proxy):
         self.control = xbmcgui.ListItem()
         self.control.setProperty(u"type", typ)
+        self.type_ = typ    # local copy, reading the property from Kodi is slow
         self.attribs = dict()
         self.proxy = weakref.ref(proxy) if proxy else lambda: None
         self.callbacks = []
@@ -73,10 +129,14 @@ class ListItem(object):
         self.callbacks.remove(cb)
 
     def update(self, changed, deleted):
+        # called by the model from any thread, changes are applied by the update queue
+        UPDATE_QUEUE.put(self, changed, deleted)
+
+    def apply(self, changed, deleted):
         # update local dictionary
         self.attribs.update(changed)
         for key in deleted:
-            del self.attribs[key]
+            self.attribs.pop(key, None)     # key may have been added and deleted within one batch
 
         if 'widget_label' in changed or 'widget_label_color' in changed:
             self.control.setLabel(get_color_string(self.attribs['widget_label'], self.attribs.get('widget_label_color')))
@@ -118,8 +178,8 @@ class ListItemSwitch(ListItem):
     def __init__(self, proxy):
         super(ListItemSwitch, self).__init__("bool", proxy)
 
-    def update(self, changed, deleted):
-        super(ListItemSwitch, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemSwitch, self).apply(changed, deleted)
         if 'item_state' in changed:
             self.control.setProperty("value", '1' if changed['item_state'] else '0')
 
@@ -145,8 +205,8 @@ class ListItemWithValue(ListItem):
         super(ListItemWithValue, self).__init__(typ, proxy)
         self.value = None
 
-    def update(self, changed, deleted):
-        super(ListItemWithValue, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemWithValue, self).apply(changed, deleted)
         if 'widget_value' in changed or 'widget_value_color' in changed:
             self.control.setProperty("value", get_color_string(self.attribs['widget_value'], self.attribs.get('widget_value_color')))
 
@@ -166,8 +226,8 @@ class ListItemColor(ListItemWithValue):
         self.set_show_next_icon(True)
         self.dialog = None
 
-    def update(self, changed, deleted):
-        super(ListItemColor, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemColor, self).apply(changed, deleted)
         if self.dialog:
             if 'widget_label' in changed:
                 self.dialog.set_title(changed['widget_label'])
@@ -191,8 +251,8 @@ class ListItemSelection(ListItemWithValue):
         self.set_show_next_icon(True)
         self.dialog = None
 
-    def update(self, changed, deleted):
-        super(ListItemSelection, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemSelection, self).apply(changed, deleted)
         if self.dialog:
             if 'widget_label' in changed:
                 self.dialog.set_title(changed['widget_label'])
@@ -222,21 +282,15 @@ class ListItemSetPoint(ListItemWithValue):
         self.set_show_next_icon(True)
         self.dialog = None
 
-    def update(self, changed, deleted):
-        super(ListItemSetPoint, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemSetPoint, self).apply(changed, deleted)
         if self.dialog:
             if 'widget_label' in changed:
                 self.dialog.set_title(changed['widget_label'])
             if 'widget_min_value' in changed or 'widget_max_value' in changed or 'widget_step' in changed:
-                selections = list(reversed(list(drange(self.attribs['widget_min_value'],
-                                                       self.attribs['widget_max_value'],
-                                                       self.attribs['widget_step']))))
-                self.dialog.set_items([str(x) for x in selections])
+                self.dialog.set_items(get_range_selections(self.attribs))
             if 'item_state' in changed:
-                selections = list(reversed(list(drange(self.attribs['widget_min_value'],
-                                                       self.attribs['widget_max_value'],
-                                                       self.attribs['widget_step']))))
-                self.dialog.set_index(get_item_index(selections, self.attribs['item_state']))
+                self.dialog.set_index(get_item_index(get_range_selections(self.attribs), self.attribs['item_state']))
 
     def onAction(self, action):
         proxy = self.proxy()
@@ -254,12 +308,11 @@ class ListItemSetPoint(ListItemWithValue):
     def onClick(self):
         proxy = self.proxy()
         if proxy:
-            selections = list(reversed(list(drange(self.attribs['widget_min_value'],
-                                                   self.attribs['widget_max_value'],
-                                                   self.attribs['widget_step']))))
+            selections = get_range_selections(self.attribs)
             self.dialog = SelectDialog(self.attribs['widget_label'],
-                                       [str(x) for x in selections],
-                                       get_item_index(selections, self.attribs['item_state']))
+                                       selections,
+                                       get_item_index(selections, self.attribs['item_state']),
+                                       label=str)
             pos = self.dialog.show()
             self.dialog = None
             if pos is not None:
@@ -272,15 +325,15 @@ class ListItemSlider(ListItemWithValue):
         self.set_show_next_icon(True)
         self.dialog = None
 
-    def update(self, changed, deleted):
-        super(ListItemSlider, self).update(changed, deleted)
+    def apply(self, changed, deleted):
+        super(ListItemSlider, self).apply(changed, deleted)
         if self.dialog:
             if 'widget_label' in changed:
                 self.dialog.set_title(changed['widget_label'])
-            if 'widget_mapping' in changed:
-                self.dialog.set_items(changed['widget_mapping'].itervalues())
+            if 'widget_min_value' in changed or 'widget_max_value' in changed or 'widget_step' in changed:
+                self.dialog.set_items(get_range_selections(self.attribs))
             if 'item_state' in changed:
-                self.dialog.set_index(get_item_index(self.attribs['widget_mapping'].keys(), self.attribs['item_state']))
+                self.dialog.set_index(get_item_index(get_range_selections(self.attribs), self.attribs['item_state']))
 
     def onAction(self, action):
         proxy = self.proxy()
@@ -298,12 +351,11 @@ class ListItemSlider(ListItemWithValue):
     def onClick(self):
         proxy = self.proxy()
         if proxy:
-            selections = list(reversed(list(drange(self.attribs['widget_min_value'],
-                                                   self.attribs['widget_max_value'],
-                                                   self.attribs['widget_step']))))
+            selections = get_range_selections(self.attribs)
             self.dialog = SelectDialog(self.attribs['widget_label'],
-                                       [str(x) for x in selections],
-                                       get_item_index(selections, self.attribs['item_state']))
+                                       selections,
+                                       get_item_index(selections, self.attribs['item_state']),
+                                       label=str)
             pos = self.dialog.show()
             self.dialog = None
             if pos is not None:
@@ -351,16 +403,93 @@ class WidgetList(object):
         self.items = []
         self.control = control  # store xbmcgui.ControlList
         self.select_valid = False   # True = a non separator line is already selected
+        self.lock = threading.Lock()    # serializes changes of the control by the GUI and the chunk thread
+        self.generation = 0     # incremented on every reset, stops adding chunks of the previous items
+        self.loaded = 0         # number of items added to the control
+        self.next_focusable = []    # position -> nearest non separator position at or after it, None = none
+        self.prev_focusable = []    # position -> nearest non separator position at or before it, None = none
+        self.trailing = 0       # number of separators at the end without next focusable position
+        self.stats = {'progressive': 0, 'first_time': 0.0, 'complete_time': 0.0}
 
     def reset(self):
-        del self.items[:]
-        self.control.reset()
+        with self.lock:
+            self.generation += 1
+            self.items = []
+            self.reset_focusable()
+            self.control.reset()
+            self.loaded = 0
 
     def add_item(self, item):
-        # add item to local list
-        self.items.append(item)
-        # add item to xbmcgui.ListControl
-        self.control.addItem(item.control)
+        with self.lock:
+            # add item to local list
+            self.items.append(item)
+            self.index_focusable(item)
+            # add item to xbmcgui.ListControl
+            self.control.addItem(item.control)
+            self.loaded += 1
+
+    def reset_focusable(self):
+        # must be called with acquired lock
+        self.next_focusable = []
+        self.prev_focusable = []
+        self.trailing = 0
+
+    def index_focusable(self, item):
+        # must be called with acquired lock, item was appended to items
+        pos = len(self.next_focusable)
+        if item.type_ != 'separator':
+            # item is the next focusable position of all separators before
+            for i in range(pos - self.trailing, pos):
+                self.next_focusable[i] = pos
+            self.trailing = 0
+            self.next_focusable.append(pos)
+            self.prev_focusable.append(pos)
+        else:
+            self.next_focusable.append(None)
+            self.prev_focusable.append(self.prev_focusable[-1] if pos else None)
+            self.trailing += 1
+
+    def set_items(self, items, position=None):
+        """Replace all items, the items may have been shown before. Large lists are added progressively,
+           the rows up to the visible part around position are added before returning."""
+        start = time.time()
+        with self.lock:
+            self.generation += 1
+            self.items = list(items)
+            self.reset_focusable()
+            for item in self.items:
+                self.index_focusable(item)
+            self.control.reset()
+            first = max(position or 0, 0) + FIRST_CHUNK_ROWS
+            self.control.addItems([item.control for item in self.items[:first]])
+            self.loaded = min(first, len(self.items))
+            if first >= len(self.items):
+                return
+            generation = self.generation
+        t = threading.Thread(target=self.add_chunks, args=(generation, first, start, time.time() - start))
+        t.daemon = True
+        t.start()
+
+    def add_chunks(self, generation, pos, start, first_time):
+        # add remaining items on later ticks, so the list can be used in the meantime
+        while True:
+            time.sleep(CHUNK_TICK)
+            with self.lock:
+                if generation != self.generation:
+                    return      # list was replaced
+                chunk = self.items[pos:pos + CHUNK_ROWS]
+                self.control.addItems([item.control for item in chunk])
+                pos += len(chunk)
+                self.loaded = pos
+                if pos >= len(self.items):
+                    break
+        complete_time = time.time() - start
+        with self.lock:
+            self.stats['progressive'] += 1
+            self.stats['first_time'] += first_time
+            self.stats['complete_time'] += complete_time
+        debugPrint(5, 'WidgetList: %d items, usable after %.3fs, complete after %.3fs',
+                   pos, first_time, complete_time)
 
     def get_selected_position(self):
         return self.control.getSelectedPosition()
@@ -369,12 +498,27 @@ class WidgetList(object):
         self.control.selectItem(pos)
 
     def select_first_item(self):
-        pos = 0
-        for item in self.items:
-            if item.control.getProperty('type') != 'separator':
-                self.control.selectItem(pos)
-                return
-            pos += 1
+        pos = self.next_focusable[0] if self.next_focusable else None
+        if pos is not None:
+            self.control.selectItem(pos)
+
+    def get_focusable(self, pos, diff):
+        """Return the nearest position from pos in direction diff which can have the focus, wraps around at the
+           end of the loaded items. Returns None if there is none."""
+        with self.lock:
+            if not 0 <= pos < self.loaded:
+                return None
+            if diff > 0:
+                result = self.next_focusable[pos]
+                if result is None or result >= self.loaded:
+                    result = self.next_focusable[0]
+            else:
+                result = self.prev_focusable[pos]
+                if result is None:
+                    result = self.prev_focusable[self.loaded - 1]
+            if result is None or result >= self.loaded:
+                return None
+            return result
 
     def add_separator_line_to_last_item(self):
         if self.items:
@@ -385,16 +529,10 @@ class WidgetList(object):
         diff = FOCUS_CHANGED_CODES.get(action.getId())
         if diff is not None:
             # skip separator lines which can't have the focus
-            size = self.control.size()
             pos = self.control.getSelectedPosition()
-            if pos >= 0:
-                while self.items[pos].control.getProperty('type') == 'separator':
-                    pos += diff
-                    if pos < 0:
-                        pos = size - 1
-                    elif pos >= size:
-                        pos = 0
-                self.control.selectItem(pos)
+            focusable = self.get_focusable(pos, diff)
+            if focusable is not None and focusable != pos:
+                self.control.selectItem(focusable)
         else:
             # any other action
             pos = self.get_selected_position()
@@ -7,6 +7,8 @@ try:    # OrderedDict is new in python 2.7
 except:
     from ordereddict import OrderedDict
 import datetime
+import hashlib
+import json
 import time
 import re
 import requests
@@ -14,7 +16,13 @@ import threading
 import weakref
 from decimal import Decimal
 from decimal import InvalidOperation
-from debugout import debugPrint
+from backoff import CircuitBreaker
+from cmddispatch import CommandDispatcher, CommandRejectedError
+from connpool import SessionPool, abort_response
+from debugout import debugEnabled, debugPrint
+from pollscheduler import PollScheduler
+from prefetch import Prefetcher
+import sse
 
 
 def split_label(label):
@@ -33,6 +41,22 @@ def split_label(label):
         return label, None
 
 
+def format_state(fmt, state):
+    """Format an item state like openHAB formats widget values, e.g. "%.1f °C".
+       Returns None if the format is not supported."""
+    if state is None:
+        return None
+    try:
+        return fmt % (state,)
+    except TypeError:
+        try:
+            return fmt % (float(state),)   # numeric conversion
+        except (TypeError, ValueError):
+            return None
+    except ValueError:
+        return None
+
+
 def as_array(x):
     """openHAB doesn't return an array of objects in the JSON rest API if there is only 1 entry in
        the array. Therefore this functions converts single entries into an array."""
@@ -59,58 +83,197 @@ def convert_mapping(raw):
 def update_proxy(func):
     """Decorator function to update all assigned proxies if any attribute changes"""
     def func_wrapper(self, *args, **kwargs):
-        func(self, *args, **kwargs)
+        result = func(self, *args, **kwargs)
         updates = self.attribs.get_changes()
+        dead = False
         for p in self.proxies:
             ref = p()
             if ref:
                 ref.update(*updates)
+            else:
+                dead = True
+        if dead:
+            prune_proxies(self)
+        return result
 
     return func_wrapper
 
 
+def prune_proxies(obj):
+    """Remove references to proxies which don't exist any more."""
+    obj.proxies = tuple([p for p in obj.proxies if p() is not None])
+
+
 class EmptyResponseError(Exception):
     """Exception for empty openHAB responses"""
     pass
 
 
 def poll_page_thread(page):
-    """Thread function to long-poll openHAB pages"""
+    """Thread function to long-poll openHAB pages as long as the page is in the hot set of the poll scheduler"""
+    try:
+        while True:
+            probe = page.oh.breaker.before_request()
+            if probe:
+                # server was not reachable => probe with a normal request instead of a long-poll
+                page.needs_catch_up = True
+            try:
+                if page.needs_catch_up:
+                    # page was paused => fetch current state before long-polling again
+                    page.needs_catch_up = False
+                    try:
+                        page.get_page()
+                    except:
+                        page.needs_catch_up = True
+                        raise
+                else:
+                    page.get_page_blocked()
+                page.oh.breaker.record_success()
+            except EmptyResponseError:
+                # openHAB server return an empty reponse (typically 5 minutes after long-poll request started)
+                # ==> try again if server connection is still alive
+                debugPrint(5, 'poll_page_thread: empty response for page %s', page.id_)
+                page.oh.breaker.record_success()
+            except requests.exceptions.ReadTimeout as e:
+                # HTTP request timed out
+                # ==> try again if server connection is still alive
+                debugPrint(5, 'poll_page_thread: %s for page %s', repr(e), page.id_)
+            except requests.exceptions.HTTPError as e:
+                # ==> wait before trying again
+                debugPrint(1, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
+                page.oh.breaker.record_failure()
+            except requests.exceptions.ConnectTimeout as e:
+                debugPrint(1, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
+                page.oh.breaker.record_failure()
+            except requests.exceptions.ConnectionError as e:
+                # openHAB server terminated the connection
+                # ==> reconnect in background or execute terminate callback and close window
+                debugPrint(5, 'poll_page_thread: %s for page %s', repr(e), page.id_)
+                page.oh.connection_lost()
+            finally:
+                if probe:
+                    page.oh.breaker.release_probe()
+
+            if not page.oh.alive:
+                # exit thread if openHAB server ist not alive any more"""
+                return
+
+            if not page.oh.poll_scheduler.keep_polling(page):
+                # exit thread if page is not visible any more
+                return
+    except Exception as e:
+        # unexpected error, e.g. invalid page data
+        # ==> exit thread, the page is polled again the next time it's started by the poll scheduler
+        debugPrint(1, 'poll_page_thread: %s for page %s, stopped polling' % (repr(e), page.id_))
+    finally:
+        page.oh.poll_scheduler.thread_done(page)
+
+
+def event_stream_thread(oh):
+    """Thread function to receive item state events from the openHAB event stream"""
     while True:
+        probe = oh.breaker.before_request()
         try:
-            page.get_page_blocked()
-        except EmptyResponseError:
-            # openHAB server return an empty reponse (typically 5 minutes after long-poll request started)
-            # ==> try again if server connection is still alive
-            debugPrint(5, 'poll_page_thread: empty response for page %s' % page.id_)
-        except requests.exceptions.ReadTimeout as e:
-            # HTTP request timed out
-            # ==> try again if server connection is still alive
-            debugPrint(5, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
+            oh.read_event_stream()
         except requests.exceptions.HTTPError as e:
-            debugPrint(1, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
+            if sse.not_supported(e):
+                # event stream not supported by openHAB server
+                # ==> fall back to long-polling of pages
+                debugPrint(1, 'event_stream_thread: %s, fall back to long-polling' % repr(e))
+                oh.stop_event_stream()
+                return
+            # server error, e.g. while openHAB is restarting
+            # ==> wait before trying again
+            debugPrint(1, 'event_stream_thread: %s' % repr(e))
+            oh.breaker.record_failure()
+        except (requests.exceptions.ReadTimeout, requests.exceptions.ChunkedEncodingError) as e:
+            # ==> try again if server connection is still alive
+            debugPrint(5, 'event_stream_thread: %s', repr(e))
         except requests.exceptions.ConnectTimeout as e:
-            debugPrint(1, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
+            debugPrint(1, 'event_stream_thread: %s' % repr(e))
+            oh.breaker.record_failure()
         except requests.exceptions.ConnectionError as e:
             # openHAB server terminated the connection
-            # ==> execute terminate callback and close window
-            debugPrint(5, 'poll_page_thread: %s for page %s' % (repr(e), page.id_))
-            page.oh.terminate()
+            # ==> reconnect in background or execute terminate callback and close window
+            debugPrint(5, 'event_stream_thread: %s', repr(e))
+            oh.connection_lost()
+        finally:
+            if probe:
+                oh.breaker.release_probe()
+
+        if not oh.alive or not oh.event_stream:
+            return
+
 
-        if not page.oh.alive:
-            # exit thread if openHAB server ist not alive any more"""
+def sitemap_subscription_thread(subscription):
+    """Thread function to receive widget changes of the subscribed page"""
+    oh = subscription.oh
+    while True:
+        probe = oh.breaker.before_request()
+        try:
+            subscription.read()
+        except requests.exceptions.HTTPError as e:
+            if subscription.url is not None and e.response is not None and e.response.status_code == 404:
+                # subscription expired, e.g. because openHAB was restarted
+                # ==> subscribe again
+                debugPrint(5, 'sitemap_subscription_thread: %s, subscribe again', repr(e))
+                subscription.url = None
+            elif sse.not_supported(e):
+                # sitemap subscriptions not supported by openHAB server
+                # ==> fall back to fetching pages
+                debugPrint(1, 'sitemap_subscription_thread: %s, fall back to long-polling' % repr(e))
+                oh.stop_sitemap_subscription()
+                return
+            else:
+                # server error, e.g. while openHAB is restarting
+                # ==> wait before trying again
+                debugPrint(1, 'sitemap_subscription_thread: %s' % repr(e))
+                oh.breaker.record_failure()
+        except (requests.exceptions.ReadTimeout, requests.exceptions.ChunkedEncodingError) as e:
+            # stream closed, typically because page was switched
+            # ==> try again if server connection is still alive
+            debugPrint(5, 'sitemap_subscription_thread: %s', repr(e))
+        except requests.exceptions.ConnectTimeout as e:
+            debugPrint(1, 'sitemap_subscription_thread: %s' % repr(e))
+            oh.breaker.record_failure()
+        except requests.exceptions.ConnectionError as e:
+            # openHAB server terminated the connection
+            # ==> reconnect in background or execute terminate callback and close window
+            debugPrint(5, 'sitemap_subscription_thread: %s', repr(e))
+            oh.connection_lost()
+        finally:
+            if probe:
+                oh.breaker.release_probe()
+
+        if not oh.alive or oh.subscription is not subscription:
             return
 
 
-class Attributes(collections.MutableMapping):
-    """A dictionary that tracks changes and stores new/changed key/value + deleted keys"""
+NO_CHANGES = {}              # returned by Attributes.get_changes if nothing changed, never modified
+NO_DELETIONS = frozenset()
+PREFIXED_KEYS = {}          # prefix -> {key: interned prefix + key}, shared by all Attributes
+
+
+class Attributes(object):
+    """A dictionary that tracks changes and stores new/changed key/value + deleted keys.
+       Changed and deleted keys are reported with the prefix, e.g. 'widget_label' for key 'label'."""
+    __slots__ = ('prefix', 'xkeys', 'store', 'changed', 'deleted')
 
     def __init__(self, prefix, *args, **kwargs):
         self.prefix = prefix
-        self.changed = dict()  # stores new and changed key/values
-        self.deleted = set()  # stores deleted keys
+        self.xkeys = PREFIXED_KEYS.setdefault(prefix, {})
+        self.changed = None  # stores new and changed key/values, None = no changes
+        self.deleted = None  # stores deleted keys, None = no deletions
         self.store = dict()
-        self.update(dict(*args, **kwargs))  # use the free update to set keys
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def xkey(self, key):
+        try:
+            return self.xkeys[key]
+        except KeyError:
+            xkey = self.xkeys[key] = intern(self.prefix + key)
+            return xkey
 
     def __getitem__(self, key):
         return self.store[key]
@@ -124,22 +287,26 @@ class Attributes(collections.MutableMapping):
 
         self.store[key] = value
 
-        xkey = self.prefix + key
-        self.changed[xkey] = value
-        try:
-            self.deleted.remove(xkey)
-        except KeyError:
-            pass
+        xkey = self.xkey(key)
+        if self.changed is None:
+            self.changed = {xkey: value}
+        else:
+            self.changed[xkey] = value
+        if self.deleted is not None:
+            self.deleted.discard(xkey)
 
     def __delitem__(self, key):
         del self.store[key]
 
-        xkey = self.prefix + key
+        xkey = self.xkey(key)
+        if self.deleted is None:
+            self.deleted = set()
         self.deleted.add(xkey)
-        try:
-            del self.changed[xkey]
-        except KeyError:
-            pass
+        if self.changed is not None:
+            self.changed.pop(xkey, None)
+
+    def __contains__(self, key):
+        return key in self.store
 
     def __iter__(self):
         return iter(self.store)
@@ -147,16 +314,19 @@ class Attributes(collections.MutableMapping):
     def __len__(self):
         return len(self.store)
 
+    def get(self, key, default=None):
+        return self.store.get(key, default)
+
     def get_changes(self):
-        result = (self.changed, self.deleted)
-        self.changed = dict()
-        self.deleted = set()
+        result = (self.changed or NO_CHANGES, self.deleted or NO_DELETIONS)
+        self.changed = None
+        self.deleted = None
         return result
 
     def get_all(self):
         changed = dict()
         for key, value in self.store.iteritems():
-            changed[self.prefix + key] = value
+            changed[self.xkey(key)] = value
         return changed
 
 
@@ -169,23 +339,94 @@ class Server(object):
         self.resources = {'items': path + 'rest/items',
                           'sitemaps': path + 'rest/sitemaps',
                           'images': path + 'images',
-                          'charts': path + 'chart'}
+                          'charts': path + 'chart',
+                          'events': path + 'rest/events'}
         self.sitemaps = {}
         self.pages = {}
         self.items = {}
         self.widgets = {}
         self.http_put_headers = {'content-type': 'text/plain'}
         self.http_get_headers = {'accept': 'application/json'}
-        self.poll_pages = False     # True = start thread for every new page to long-poll changes
+        self.poll_pages = False     # True = long-poll changes of all pages in the hot set of the poll scheduler
+        self.poll_scheduler = PollScheduler(self, poll_page_thread)
+        self.event_stream = False   # True = receive item states via event stream instead of long-polling
+        self.subscription = None    # active sitemap subscription
+        self.stream_threads = []    # event stream and sitemap subscription threads
         self.http_proxies = None      # proxy for requests library
+        self.http = SessionPool()       # keep-alive connections shared by all requests
+        self.dispatcher = CommandDispatcher()   # sends item commands in background
+        self.prefetcher = Prefetcher(self)      # fetches linked pages in background
         self.alive = True
+        self.breaker = CircuitBreaker(lambda: self.alive)   # backoff if server is not reachable
+        self.breaker.callbacks.append(self.connection_state_changed)
+        self.resume = True          # True = reconnect if connection is lost, False = terminate
+        self.item_widgets = {}      # item name -> set of widgets showing the item
+        self.visible_pages = []     # pages shown by the UI, never evicted
+        self.max_loaded_pages = 50  # least recently used pages beyond are unloaded
+        self.evicted = {'pages': 0, 'widgets': 0, 'items': 0, 'unloaded': 0}
+        self.model_lock = threading.RLock()     # serializes page updates and collect()
+        self.collect_every = 10     # collect() runs on every n-th navigation ...
+        self.collect_interval = 60  # ... or if it didn't run for this time [s]
+        self.navigations = 0        # navigations since the last collect()
+        self.collected_at = time.time()
+        self.validators = {}        # url -> (etag, content hash) of the last response, for conditional fetches
+        self.stats_lock = threading.Lock()    # guards validators and statistics
+        self.conditional_stats = {'hits': 0, 'misses': 0}
+        self.widget_stats = {'reinit': 0, 'skipped': 0}     # widget updates of existing widgets
         self.terminate_callback = []
 
     def terminate(self):
         self.alive = False
+        with self.breaker.cond:
+            self.breaker.cond.notify_all()      # wake up waiting threads
         for cb in self.terminate_callback:
             cb(self)
 
+    def close(self, timeout=2.0):
+        """Stop all threads and release all connections, e.g. if the window is closed. Pending commands
+           are sent within timeout seconds, requests in flight (e.g. long-polls) are aborted.
+           Returns the number of threads and connections still alive after timeout."""
+        self.alive = False
+        deadline = time.time() + timeout
+        self.dispatcher.close(timeout)
+        with self.breaker.cond:
+            self.breaker.cond.notify_all()      # wake up waiting threads
+        self.prefetcher.close()
+        self.event_stream = False
+        if self.subscription is not None:
+            self.subscription.close()
+        self.http.close()
+        threads = self.get_threads()
+        for t in threads:
+            t.join(max(deadline - time.time(), 0))
+        result = {'threads': len([t for t in threads if t.is_alive()]),
+                  'connections': self.http.open_connections()}
+        debugPrint(5, 'Server closed, %d threads and %d connections still alive', result['threads'],
+                   result['connections'])
+        return result
+
+    def get_threads(self):
+        """Return all threads started for this server."""
+        with self.poll_scheduler.lock:
+            threads = list(self.poll_scheduler.threads.values())
+        return threads + self.prefetcher.threads + self.dispatcher.threads + self.stream_threads
+
+    def connection_lost(self):
+        if not self.alive:
+            return      # requests aborted by close
+        if self.resume:
+            # keep pages, items and widgets and reconnect in background
+            self.breaker.record_failure()
+        else:
+            self.terminate()
+
+    def connection_state_changed(self, state):
+        if state == 'closed':
+            # server reachable again => fetch visible pages to resync their state
+            for page in self.pages.values():
+                if self.poll_scheduler.is_hot(page):
+                    self.poll_scheduler.refresh(page)
+
     def set_basic_auth(self, username, password):
         auth = 'Basic %s' % base64.b64encode('%s:%s' % (username, password))
         self.http_put_headers['authorization'] = auth
@@ -199,25 +440,199 @@ class Server(object):
         else:
             self.http_proxies = {'http': proxy, 'https': proxy}
 
-    def fetch_abs_json_url(self, url, extra_headers=None):
-        """Fetch url from openHAB  server and convert data from json to Python data structures."""
+    def fetch_abs_json_url(self, url, extra_headers=None, background=False, conditional=False):
+        """Fetch url from openHAB  server and convert data from json to Python data structures.
+           Background fetches (long-polls and prefetches) don't pause the prefetcher.
+           Conditional fetches return None instead of the data if the response is unchanged since the last
+           conditional fetch of url (HTTP 304 or same content hash), the response is not decoded then."""
         headers = self.http_get_headers
-        if extra_headers is not None:
-            headers.update(extra_headers)
-        debugPrint(5, 'fetching json url=%s, headers=%s' % (url, repr(headers)))
-        resp = requests.get(url, headers=headers, proxies=self.http_proxies)
-        debugPrint(5, 'response for url=%s, text=%s, headers=%s' % (url, resp.text, resp.headers))
+        validator = None
+        if conditional:
+            with self.stats_lock:
+                validator = self.validators.get(url)
+        if extra_headers is not None or (validator is not None and validator[0] is not None):
+            headers = dict(headers)     # don't modify default headers, they are shared by all threads
+            if extra_headers is not None:
+                headers.update(extra_headers)
+            if validator is not None and validator[0] is not None:
+                headers['if-none-match'] = validator[0]
+        debugPrint(5, 'fetching json url=%s, headers=%s', url, repr(headers))
+        if background:
+            resp = self.http.get(url, headers=headers, proxies=self.http_proxies)
+        else:
+            self.prefetcher.foreground_begin()
+            try:
+                resp = self.http.get(url, headers=headers, proxies=self.http_proxies)
+            finally:
+                self.prefetcher.foreground_end()
+        if debugEnabled(5):
+            # resp.text decodes the whole body, skip it if not logged
+            debugPrint(5, 'response for url=%s, text=%s, headers=%s', url, resp.text, resp.headers)
+        if conditional and resp.status_code == requests.codes.not_modified and validator is not None:
+            self.count_conditional(True)
+            return None, resp.headers
         if resp.status_code != requests.codes.ok:
             resp.raise_for_status()
-        if resp.text == '':
+        if resp.content == b'':
             # openHAB returns an empty response after 5 minutes if long-polling is enabled
             raise EmptyResponseError
+        if conditional:
+            digest = hashlib.md5(resp.content).digest()
+            with self.stats_lock:
+                self.validators[url] = (resp.headers.get('etag'), digest)
+            if validator is not None and validator[1] == digest:
+                self.count_conditional(True)
+                return None, resp.headers
+            self.count_conditional(False)
         return resp.json(), resp.headers
 
+    def index_widget(self, widget, old_item, new_item):
+        """Update the item -> widgets index if the item of widget has changed."""
+        if old_item is not None:
+            widgets = self.item_widgets.get(old_item.name)
+            if widgets is not None:
+                widgets.discard(widget)
+                if not widgets:
+                    del self.item_widgets[old_item.name]
+        if new_item is not None:
+            self.item_widgets.setdefault(new_item.name, set()).add(widget)
+
+    def get_item_widgets(self, item):
+        """Return all widgets showing item."""
+        return list(self.item_widgets.get(item.name, ()))
+
+    def item_touched(self, item, origin=None):
+        """Forget the validators of all pages showing item, except origin (the page whose data changed item).
+           The last response of these pages doesn't match the model any more, so the next response has to be
+           applied even if it is unchanged."""
+        for w in self.get_item_widgets(item):
+            if w.parent is not origin:
+                self.forget_validator(w.parent.attribs['link'])
+
+    def item_changed(self, item, origin=None):
+        """Show the new state of item in all widgets of all pages without fetching the pages.
+           Returns the pages containing widgets whose value can't be derived from the item state."""
+        self.item_touched(item, origin)
+        pages = set()
+        for w in self.get_item_widgets(item):
+            if not w.update_value():
+                pages.add(w.parent)
+        return pages
+
+    def get_index_stats(self):
+        """Return size of the item -> widgets index, for diagnostics."""
+        widgets = [len(w) for w in self.item_widgets.values()]
+        return {'items': len(widgets), 'widgets': sum(widgets), 'max_widgets': max(widgets) if widgets else 0}
+
+    def count_conditional(self, hit):
+        with self.stats_lock:
+            self.conditional_stats['hits' if hit else 'misses'] += 1
+
+    def count_widget(self, page, reinit):
+        key = 'reinit' if reinit else 'skipped'
+        page.widget_stats[key] += 1
+        with self.stats_lock:
+            self.widget_stats[key] += 1
+
+    def forget_validator(self, url):
+        with self.stats_lock:
+            self.validators.pop(url, None)
+
+    def invalidate_validators(self):
+        """Forget all validators, called if the state of pages was changed without fetching them.
+           The next conditional fetch of every page returns the data even if the response is unchanged."""
+        with self.stats_lock:
+            self.validators.clear()
+
     def fetch_rel_json_url(self, name, headers=None):
         """Fetch url from openHAB server and convert data from json to Python data structures."""
         return self.fetch_abs_json_url('http://%s:%s/rest%s' % (self.host, self.port, name), headers)
 
+    def use_pages(self, pages):
+        now = time.time()
+        for page in pages:
+            page.used_at = now
+        self.visible_pages = list(pages)
+
+    def maybe_collect(self):
+        """Run collect() on every collect_every-th navigation or after collect_interval seconds. A full
+           collect walks all loaded pages, it's too slow to run on every page change in the GUI thread."""
+        self.navigations += 1
+        if self.navigations >= self.collect_every or time.time() - self.collected_at >= self.collect_interval:
+            self.collect()
+
+    def collect(self):
+        """Evict pages, widgets and items which are not reachable from any sitemap homepage or visible page
+           any more, e.g. widgets removed from a page. If more than max_loaded_pages pages are loaded, the
+           widgets of the least recently used pages are dropped, these pages are fetched again if shown."""
+        with self.model_lock:
+            self.navigations = 0
+            self.collected_at = time.time()
+
+            # objects created while marking are not evicted
+            pages_before = set(self.pages.keys())
+            widgets_before = set(self.widgets.keys())
+            items_before = set(self.items.keys())
+
+            keep = frozenset([p.id_ for p in self.visible_pages])
+            loaded = [p for p in self.pages.values()
+                      if p.raw is not None and p.id_ not in keep and not self.poll_scheduler.is_hot(p)]
+            if len(loaded) > self.max_loaded_pages:
+                loaded.sort(key=lambda p: p.used_at)
+                for page in loaded[:len(loaded) - self.max_loaded_pages]:
+                    page.unload()
+                    self.forget_validator(page.attribs['link'])
+                    self.evicted['unloaded'] += 1
+
+            # mark
+            pages = set()
+            widgets = set()
+            items = set()
+            stack = [s.page for s in self.sitemaps.values() if s.page is not None] + self.visible_pages
+            while stack:
+                page = stack.pop()
+                if page.id_ in pages:
+                    continue
+                pages.add(page.id_)
+                todo = list(page.widgets)
+                while todo:
+                    w = todo.pop()
+                    widgets.add(w.widgetId)
+                    if w.item is not None:
+                        items.add(w.item.name)
+                    if isinstance(w, FrameWidget):
+                        todo.extend(w.widgets)
+                    elif isinstance(w, (GroupWidget, TextWidget)) and w.page is not None:
+                        stack.append(w.page)
+
+            # sweep
+            for id_ in pages_before - pages:
+                page = self.pages.pop(id_, None)
+                if page is not None:
+                    self.poll_scheduler.forget(page)
+                    self.prefetcher.forget(page)
+                    self.forget_validator(page.attribs['link'])
+                    self.evicted['pages'] += 1
+            for id_ in widgets_before - widgets:
+                w = self.widgets.pop(id_, None)
+                if w is not None:
+                    self.index_widget(w, w.item, None)
+                    self.evicted['widgets'] += 1
+            for name in items_before - items:
+                if self.items.pop(name, None) is not None:
+                    self.evicted['items'] += 1
+
+    def get_cache_stats(self):
+        """Return sizes of the model caches and number of evicted objects."""
+        result = {'pages': len(self.pages),
+                  'loaded_pages': len([p for p in self.pages.values() if p.raw is not None]),
+                  'widgets': len(self.widgets),
+                  'items': len(self.items),
+                  'validators': len(self.validators)}
+        for key, value in self.evicted.items():
+            result['evicted_' + key] = value
+        return result
+
     def load_resources(self):
         """Fetch resources (http:<ip>:<port>/rest) from openHAB."""
         self.resources = {}
@@ -237,6 +652,127 @@ class Server(object):
             self.sitemaps[i['name']] = Sitemap(self, i)
         return self.sitemaps
 
+    def set_visible_pages(self, pages):
+        """Set pages shown by the UI, last entry is the page on top."""
+        self.use_pages(pages)
+        if self.subscription is not None and pages:
+            # only the page on top receives updates via the sitemap subscription
+            self.poll_scheduler.set_hot_pages(pages[-1:])
+            self.subscription.set_page(pages[-1])
+        else:
+            self.poll_scheduler.set_hot_pages(pages)
+        self.maybe_collect()
+
+    def start_sitemap_subscription(self, sitemap):
+        """Receive widget changes of the visible page via a sitemap subscription instead of long-polling."""
+        if self.subscription is not None:
+            return
+        self.subscription = SitemapSubscription(sitemap)
+        self.poll_scheduler.long_poll = False
+        t = threading.Thread(target=sitemap_subscription_thread, args=(self.subscription,))
+        t.daemon = True
+        self.stream_threads.append(t)
+        t.start()
+
+    def stop_sitemap_subscription(self):
+        """Fall back to long-polling of visible pages."""
+        subscription = self.subscription
+        self.subscription = None
+        if subscription is not None:
+            subscription.close()
+        if not self.event_stream:
+            self.poll_scheduler.long_poll = True
+        for page in self.pages.values():
+            if self.poll_scheduler.is_hot(page):
+                self.poll_scheduler.start(page)
+
+    def start_event_stream(self):
+        """Receive all item state changes via one event stream connection. Visible pages are not
+           long-polled any more, they are only fetched if an item of the page changes."""
+        if self.event_stream:
+            return
+        self.event_stream = True
+        self.poll_scheduler.long_poll = False
+        t = threading.Thread(target=event_stream_thread, args=(self,))
+        t.daemon = True
+        self.stream_threads.append(t)
+        t.start()
+
+    def stop_event_stream(self):
+        """Fall back to long-polling of visible pages."""
+        self.event_stream = False
+        if self.subscription is None:
+            self.poll_scheduler.long_poll = True
+        for page in self.pages.values():
+            if self.poll_scheduler.is_hot(page):
+                self.poll_scheduler.start(page)
+
+    def read_event_stream(self):
+        """Connect to the event stream and process events until the connection is closed."""
+        headers = dict(self.http_get_headers)
+        headers['accept'] = 'text/event-stream'
+        debugPrint(5, 'connecting event stream url=%s', self.resources['events'])
+        resp = self.http.get(self.resources['events'], params={'topics': 'smarthome/items/*/state'},
+                             headers=headers, proxies=self.http_proxies, stream=True)
+        try:
+            if resp.status_code != requests.codes.ok:
+                resp.raise_for_status()
+            self.breaker.record_success()
+            # read chunks as they arrive, events are small and shall be processed immediately
+            for event, data in sse.iter_events(resp.iter_lines(chunk_size=1)):
+                if not self.alive or not self.event_stream:
+                    return
+                self.process_event(data)
+        finally:
+            resp.close()
+
+    def process_event(self, data):
+        """Route an ItemStateEvent to the matching item."""
+        debugPrint(5, 'event: %s', data)
+        try:
+            event = json.loads(data)
+            if event.get('type') != 'ItemStateEvent':
+                return
+            # topic = smarthome/items/<name>/state
+            name = event['topic'].split('/')[2]
+            item = self.items.get(name)
+            if item is None:
+                return      # item not used by any loaded page
+            item.update_state(json.loads(event['payload'])['value'])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            debugPrint(1, 'process_event: invalid event %s: %s' % (data, repr(e)))
+            return
+
+        # update all widgets showing this item and drop the validators of their pages, fetch visible pages
+        # only if a widget value can't be derived from the item state (not required for the subscribed page,
+        # the sitemap subscription sends the widget changes)
+        subscribed = self.subscription.page if self.subscription is not None else None
+        for page in self.item_changed(item):
+            if page is not subscribed and self.poll_scheduler.is_hot(page):
+                self.poll_scheduler.refresh(page)
+
+    def get_snapshot(self, sitemap):
+        """Return the raw data of sitemap and all its loaded pages, homepage first."""
+        pages = [sitemap.page.raw]
+        for page in self.pages.values():
+            if page.sitemap is sitemap and page is not sitemap.page and page.raw is not None:
+                pages.append(page.raw)
+        return {'sitemap': {'name': sitemap.name, 'label': sitemap.label, 'link': sitemap.link},
+                'pages': pages}
+
+    def restore_snapshot(self, data):
+        """Create sitemap, pages, widgets and items from a snapshot without contacting openHAB.
+           All pages are marked for a catch-up fetch, so they are revalidated as soon as they are shown."""
+        sitemap = Sitemap(self, data['sitemap'])
+        self.sitemaps[sitemap.name] = sitemap
+        pages = data['pages']
+        sitemap.page = self.create_page_class(sitemap, pages[0])
+        for pageData in pages[1:]:
+            self.create_page_class(sitemap, pageData)
+        for page in self.pages.values():
+            page.needs_catch_up = True
+        return sitemap
+
     def load_items(self):
         """Load items from openHAB and create python instances for every openHAB item."""
         self.items = {}
@@ -253,28 +789,27 @@ class Server(object):
             return None
         elif pageData['id'] in self.pages:      # test if page already exists
             i = self.pages[pageData['id']]
+            # e.g. the linked page data of a parent page, the last response of the page itself is outdated
+            self.forget_validator(i.attribs['link'])
             i.init(pageData)
             return i
         else:
             i = Page(sitemap, pageData, prevPage)
 
-            if self.poll_pages:
-                # start a new thread for every page that polls updates
-                t = threading.Thread(target=poll_page_thread, args=(i,))
-                t.daemon = True
-                t.start()
-
             # add new instance to dict of all pages
             self.pages[i.id_] = i
             return i
 
-    def create_item_class(self, itemData):
-        """Create an openHAB item instance from the given hash properties."""
+    def create_item_class(self, itemData, page=None):
+        """Create an openHAB item instance from the given hash properties, page is the page whose data
+           contains itemData."""
         if itemData is None:
             return None
         elif itemData['name'] in self.items:    # test if item already exists
             i = self.items[itemData['name']]
-            i.init(itemData)
+            if i.state_changed(itemData):
+                i.init(itemData)
+                self.item_changed(i, page)
             return i
         else:
             if itemData['type'] == 'Call':
@@ -313,7 +848,14 @@ class Server(object):
             return None
         elif widgetData['widgetId'] in self.widgets:  # test if widget already exists
             i = self.widgets[widgetData['widgetId']]
-            i.init(widgetData)
+            if widgetData == i.raw:
+                # unchanged since last init, but the shared item may have been changed by another page or a
+                # command in the meantime ==> apply the item state of the widget data
+                self.create_item_class(widgetData.get('item'), page)
+                self.count_widget(page, False)
+            else:
+                i.init(widgetData)
+                self.count_widget(page, True)
             return i
         else:
             if widgetData['type'] == 'Colorpicker':
@@ -365,12 +907,116 @@ class Sitemap(object):
         """Load sitemap homepage from openHAB and create SitemapPage instance."""
         result = self.oh.fetch_abs_json_url(self.link)[0]
         self.page = self.oh.create_page_class(self, result['homepage'])
+        self.page.fetched_at = time.time()
         return self.page
 
 
+class SitemapSubscription(object):
+    """openHAB sitemap subscription. The subscription pushes the widget changes of one page at a time,
+       switching the page reuses the subscription."""
+
+    def __init__(self, sitemap):
+        self.sitemap = sitemap
+        self.oh = sitemap.oh
+        self.url = None     # subscription url returned by openHAB
+        self.page = None    # subscribed page
+        self.resp = None    # open event stream
+        self.lock = threading.Lock()
+        self.page_changed = threading.Event()
+        self.reconnecting = False    # True = stream closed on purpose to switch page
+
+    def subscribe(self):
+        resp = self.oh.http.post(self.oh.resources['sitemaps'] + '/events/subscribe',
+                                 headers=self.oh.http_get_headers, proxies=self.oh.http_proxies)
+        if resp.status_code not in (requests.codes.ok, requests.codes.created):
+            resp.raise_for_status()
+        self.url = resp.json()['context']['headers']['Location'][0]
+        debugPrint(5, 'SitemapSubscription: subscribed, url=%s', self.url)
+
+    def set_page(self, page):
+        """Switch subscription to page."""
+        with self.lock:
+            if page is self.page:
+                return
+            self.page = page
+            self.close_stream()
+        self.page_changed.set()
+
+    def close_stream(self):
+        # abort current stream to reconnect with new page id
+        if self.resp is not None:
+            self.reconnecting = True
+            abort_response(self.resp)
+            self.resp = None
+
+    def close(self):
+        with self.lock:
+            self.page = None
+            self.close_stream()
+        self.page_changed.set()
+
+    def read(self):
+        """Open event stream for the current page and apply widget changes until the stream is closed."""
+        if self.page is None:
+            self.page_changed.wait(60)
+            self.page_changed.clear()
+            return
+        if self.url is None:
+            self.subscribe()
+
+        headers = dict(self.oh.http_get_headers)
+        headers['accept'] = 'text/event-stream'
+        self.page_changed.clear()
+        page = self.page
+        if page is None:
+            return
+        debugPrint(5, 'SitemapSubscription: connecting for page %s', page.id_)
+        resp = self.oh.http.get(self.url, params={'sitemap': self.sitemap.name, 'pageid': page.id_},
+                                headers=headers, proxies=self.oh.http_proxies, stream=True)
+        with self.lock:
+            if self.page is not page:
+                resp.close()    # page switched while connecting
+                return
+            self.reconnecting = False
+            self.resp = resp
+        try:
+            if resp.status_code != requests.codes.ok:
+                resp.raise_for_status()
+            self.oh.breaker.record_success()
+            for event, data in sse.iter_events(resp.iter_lines(chunk_size=1)):
+                if self.page is not page:
+                    return
+                self.process_event(data)
+        except Exception:
+            if self.reconnecting:
+                return  # stream closed by set_page
+            raise
+        finally:
+            resp.close()
+
+    def process_event(self, data):
+        debugPrint(5, 'sitemap event: %s', data)
+        try:
+            event = json.loads(data)
+        except ValueError as e:
+            debugPrint(1, 'SitemapSubscription: invalid event %s: %s' % (data, repr(e)))
+            return
+        if 'widgetId' not in event:
+            # e.g. sitemap changed => fetch whole page
+            self.oh.poll_scheduler.refresh(self.page)
+            return
+        widget = self.oh.widgets.get(event['widgetId'])
+        if widget is not None:
+            with self.oh.model_lock:    # the event may change the item of the widget
+                widget.apply_event(event)
+            self.oh.invalidate_validators()
+
+
 class Page(object):
     """Python representative of a page of widgets in openHAB. A page can be the homepage of a sitemap
        or the linked page of a group or text widget."""
+    __slots__ = ('sitemap', 'prevPage', 'oh', 'id_', 'attribs', 'proxies', 'widgets', 'atmos_id', 'needs_catch_up',
+                 'fetched_at', 'used_at', 'raw', 'widget_stats', '__weakref__')
 
     def __init__(self, sitemap, pageData, prevPage=None):
         self.sitemap = sitemap
@@ -378,59 +1024,104 @@ class Page(object):
         self.oh = sitemap.oh
         self.id_ = pageData['id']
         self.attribs = Attributes('page_')
-        self.proxies = []
+        self.proxies = ()
         self.widgets = []
         self.atmos_id = None
+        # True = page state might be outdated. A linked page is created from the data embedded in its parent
+        # page, which may be much older than the moment the page is shown => fetch it before the first
+        # long-poll, exactly like a page which was paused.
+        self.needs_catch_up = prevPage is not None
+        self.fetched_at = 0     # time of last fetch
+        self.used_at = 0        # time the page was shown last
+        self.raw = None         # last received page data, used for snapshots
+        self.widget_stats = {'reinit': 0, 'skipped': 0}     # widget updates of the last init
         self.init(pageData)
 
     def set_proxy(self, proxy):
-        self.proxies.append(weakref.ref(proxy))
+        prune_proxies(self)
+        self.proxies += (weakref.ref(proxy),)
         changed = self.attribs.get_all()
-        proxy.update(changed, set())
+        proxy.apply(changed, set())
 
     @update_proxy
     def init(self, pageData):
-        self.attribs['link'] = pageData['link']
-        self.attribs['leaf'] = pageData['leaf']
-        x = split_label(pageData.get('title'))
-        self.attribs['title'] = x[0]
-        self.attribs['value'] = x[1]
-        if 'widgets' in pageData:
-            self.create_all_widgets(as_array(pageData['widgets']))
+        # pages are updated by poll, prefetch and GUI threads, collect() must not see a half built page
+        with self.oh.model_lock:
+            self.raw = pageData
+            self.widget_stats = {'reinit': 0, 'skipped': 0}
+            self.attribs['link'] = pageData['link']
+            self.attribs['leaf'] = pageData['leaf']
+            x = split_label(pageData.get('title'))
+            self.attribs['title'] = x[0]
+            self.attribs['value'] = x[1]
+            if 'widgets' in pageData:
+                self.create_all_widgets(as_array(pageData['widgets']))
 
     def create_all_widgets(self, widgets):
-        # create list of all existing widget-ids in case of an update
-        id_list = frozenset([w.widgetId for w in self.widgets])
+        result = []
         for w in widgets:
             i = self.oh.create_widget_class(self, w)
-            if i is not None and i.widgetId not in id_list:
-                self.widgets.append(i)
+            if i is not None:
+                result.append(i)
+        # replace in place, removed widgets disappear from lists referring to this page's widgets
+        self.widgets[:] = result
+
+    def unload(self):
+        """Drop all widgets to save memory. The page has to be fetched again before it is shown."""
+        self.widgets[:] = []
+        self.raw = None
+        self.needs_catch_up = True
+        self.atmos_id = None
 
-    def get_page(self, headers=None):
-        (pageData, headers) = self.oh.fetch_abs_json_url(self.attribs['link'], headers)
-        self.init(pageData)
+    def linked_pages(self):
+        """Return the linked pages of all group and text widgets of this page."""
+        result = []
+        widgets = list(reversed(self.widgets))
+        while widgets:
+            w = widgets.pop()
+            if isinstance(w, (GroupWidget, TextWidget)) and w.page is not None:
+                result.append(w.page)
+            elif isinstance(w, FrameWidget):
+                widgets.extend(reversed(w.widgets))
+        return result
+
+    def get_page(self, headers=None, background=False):
+        (pageData, headers) = self.oh.fetch_abs_json_url(self.attribs['link'], headers, background,
+                                                         conditional=True)
+        self.fetched_at = time.time()
+        if pageData is not None:
+            self.init(pageData)     # otherwise unchanged since last fetch
+            debugPrint(5, 'page %s updated, %d widgets re-initialized, %d skipped', self.id_,
+                       self.widget_stats['reinit'], self.widget_stats['skipped'])
         self.atmos_id = headers.get('x-atmosphere-tracking-id')
 
     def get_page_blocked(self):
         headers = {'x-atmosphere-transport': 'long-polling'}
         if self.atmos_id is not None:
             headers['x-atmosphere-tracking-id'] = self.atmos_id
-        self.get_page(headers)
+        self.get_page(headers, background=True)
 
 
 class WidgetBase(object):
+    __slots__ = ('page', 'oh', 'type_', 'widgetId', 'parent', 'raw', 'item', 'value_format', 'attribs', 'proxies',
+                 '__weakref__')
+
     def __init__(self, page, widgetData):
         self.page = page
         self.oh = page.oh
         self.type_ = widgetData['type']
         self.widgetId = widgetData['widgetId']
+        self.parent = page          # page containing this widget
+        self.raw = None             # widget data of the last init, None = init required on next update
         self.item = None
+        self.value_format = None    # format to derive the value from the item state, None = unknown
         self.attribs = Attributes('widget_')
-        self.proxies = []
+        self.proxies = ()
         self.init(widgetData)
 
     @update_proxy
     def init(self, widgetData):
+        self.raw = widgetData
         x = split_label(widgetData.get('label'))
         self.attribs['label'] = x[0]
         self.attribs['value'] = x[1]
@@ -440,22 +1131,74 @@ class WidgetBase(object):
             self.attribs['icon'] = None
         self.attribs['label_color'] = widgetData.get('labelcolor')
         self.attribs['value_color'] = widgetData.get('valuecolor')
-        self.item = self.oh.create_item_class(widgetData.get('item'))
+        self.set_item(self.oh.create_item_class(widgetData.get('item'), self.parent))
+
+    @update_proxy
+    def apply_event(self, eventData):
+        """Apply widget changes received via sitemap subscription"""
+        self.raw = None     # state differs from widget data now
+        if 'label' in eventData:
+            x = split_label(eventData['label'])
+            self.attribs['label'] = x[0]
+            self.attribs['value'] = x[1]
+        if 'labelcolor' in eventData:
+            self.attribs['label_color'] = eventData['labelcolor']
+        if 'valuecolor' in eventData:
+            self.attribs['value_color'] = eventData['valuecolor']
+        if eventData.get('item'):
+            self.set_item(self.oh.create_item_class(eventData['item']))
+        self.value_format = self.get_value_format()
 
     def set_proxy(self, proxy):
-        self.proxies.append(weakref.ref(proxy))
-        proxy.update(self.attribs.get_all(), set())
+        prune_proxies(self)
+        self.proxies += (weakref.ref(proxy),)
+        proxy.apply(self.attribs.get_all(), set())
 
         if self.item:
             self.item.set_proxy(proxy)
 
+    def set_item(self, item):
+        if item is not self.item:
+            self.oh.index_widget(self, self.item, item)
+            self.item = item
+        self.value_format = self.get_value_format()
+
+    def get_value_format(self):
+        """Return the format which reproduces the value shown by openHAB from the item state,
+           None if the value can't be derived from the item state."""
+        value = self.attribs['value']
+        if self.item is None or value is None or self.item.pattern is None:
+            return None
+        # only the pattern of the item is trusted. A format guessed from one matching sample (e.g. '%s' for state
+        # '20' of a '%d' pattern, or a MAP transformation mapping a value to itself) would show later states
+        # wrong, and the page isn't fetched again to correct them.
+        if format_state(self.item.pattern, self.item.raw_state) == value:
+            return self.item.pattern
+        return None
+
+    @update_proxy
+    def update_value(self):
+        """Show the current item state, returns False if the page has to be fetched to get the value."""
+        if self.value_format is None:
+            return False
+        value = format_state(self.value_format, self.item.raw_state)
+        if value is None:
+            return False
+        self.attribs['value'] = value
+        self.raw = None     # state differs from widget data now
+        return True
+
 
 class ColorPickerWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(ColorPickerWidget, self).__init__(page, widgetData)
 
 
 class ChartWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(ChartWidget, self).__init__(page, widgetData)
 
@@ -474,6 +1217,8 @@ class ChartWidget(WidgetBase):
 
 
 class FrameWidget(WidgetBase):
+    __slots__ = ('widgets',)
+
     def __init__(self, page, widgetData):
         self.widgets = []  # assign widgets before calling super because this in turns calls init
         super(FrameWidget, self).__init__(page, widgetData)
@@ -482,14 +1227,18 @@ class FrameWidget(WidgetBase):
     def init(self, widgetData):
         super(FrameWidget, self).init(widgetData)
         if 'widgets' in widgetData:
-            self.widgets = []
+            # assign the complete list, collect() may read it at any time
+            widgets = []
             for w in as_array(widgetData['widgets']):
-                i = self.oh.create_widget_class(self.page, w)
+                i = self.oh.create_widget_class(self.parent, w)
                 if i is not None:
-                    self.widgets.append(i)
+                    widgets.append(i)
+            self.widgets = widgets
 
 
 class GroupWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(GroupWidget, self).__init__(page, widgetData)
 
@@ -497,13 +1246,15 @@ class GroupWidget(WidgetBase):
     def init(self, widgetData):
         super(GroupWidget, self).init(widgetData)
         if 'linkedPage' in widgetData:
-            self.page = self.oh.create_page_class(self.page.sitemap, widgetData['linkedPage'], self.page)
+            self.page = self.oh.create_page_class(self.parent.sitemap, widgetData['linkedPage'], self.parent)
         else:
             self.page = None
 
 
 
 class ImageWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(ImageWidget, self).__init__(page, widgetData)
 
@@ -519,6 +1270,8 @@ class ImageWidget(WidgetBase):
 
 
 class SelectionWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(SelectionWidget, self).__init__(page, widgetData)
 
@@ -529,8 +1282,16 @@ class SelectionWidget(WidgetBase):
         if self.attribs['mapping'] and self.attribs['value'] is None and self.item.attribs['state'] is not None:
             self.attribs['value'] = self.attribs['mapping'].get(self.item.attribs['state'])
 
+    @update_proxy
+    def apply_event(self, eventData):
+        super(SelectionWidget, self).apply_event(eventData)
+        if self.attribs['mapping'] and self.attribs['value'] is None and self.item.attribs['state'] is not None:
+            self.attribs['value'] = self.attribs['mapping'].get(self.item.attribs['state'])
+
 
 class SetPointWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(SetPointWidget, self).__init__(page, widgetData)
 
@@ -543,6 +1304,8 @@ class SetPointWidget(WidgetBase):
 
 
 class SliderWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(SliderWidget, self).__init__(page, widgetData)
 
@@ -557,6 +1320,8 @@ class SliderWidget(WidgetBase):
 
 
 class SwitchWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(SwitchWidget, self).__init__(page, widgetData)
 
@@ -567,8 +1332,16 @@ class SwitchWidget(WidgetBase):
         if self.attribs['mapping'] and self.attribs['value'] is None and self.item.attribs['state'] is not None:
             self.attribs['value'] = self.attribs['mapping'].get(self.item.attribs['state'])
 
+    @update_proxy
+    def apply_event(self, eventData):
+        super(SwitchWidget, self).apply_event(eventData)
+        if self.attribs['mapping'] and self.attribs['value'] is None and self.item.attribs['state'] is not None:
+            self.attribs['value'] = self.attribs['mapping'].get(self.item.attribs['state'])
+
 
 class TextWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(TextWidget, self).__init__(page, widgetData)
 
@@ -576,12 +1349,14 @@ class TextWidget(WidgetBase):
     def init(self, widgetData):
         super(TextWidget, self).init(widgetData)
         if 'linkedPage' in widgetData:
-            self.page = self.oh.create_page_class(self.page.sitemap, widgetData['linkedPage'], self.page)
+            self.page = self.oh.create_page_class(self.parent.sitemap, widgetData['linkedPage'], self.parent)
         else:
             self.page = None
 
 
 class VideoWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(VideoWidget, self).__init__(page, widgetData)
 
@@ -593,6 +1368,8 @@ class VideoWidget(WidgetBase):
 
 
 class MapViewWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(MapViewWidget, self).__init__(page, widgetData)
 
@@ -602,6 +1379,8 @@ class MapViewWidget(WidgetBase):
 
 
 class WebViewWidget(WidgetBase):
+    __slots__ = ()
+
     def __init__(self, page, widgetData):
         super(WebViewWidget, self).__init__(page, widgetData)
 
@@ -613,23 +1392,45 @@ class WebViewWidget(WidgetBase):
 
 
 class ItemBase(object):
+    __slots__ = ('oh', 'name', 'type_', 'link', 'attribs', 'proxies', 'atmos_id', 'raw_state', 'pattern',
+                 '__weakref__')
+
     def __init__(self, oh, itemData):
         self.oh = oh
         self.name = itemData['name']
         self.type_ = itemData['type']
         self.link = itemData['link']
         self.attribs = Attributes('item_')
-        self.proxies = []
+        self.proxies = ()
         self.atmos_id = None  # ID used for long polling
+        self.raw_state = None   # state as received from openHAB
+        self.pattern = None     # format of the state defined by openHAB, e.g. "%.1f °C"
         self.init(itemData)
 
     def set_proxy(self, proxy):
-        self.proxies.append(weakref.ref(proxy))
-        proxy.update(self.attribs.get_all(), set())
+        prune_proxies(self)
+        self.proxies += (weakref.ref(proxy),)
+        proxy.apply(self.attribs.get_all(), set())
 
     @update_proxy
     def init(self, itemData):
         self.attribs['state'] = self.state_from_string(itemData['state']) if 'state' in itemData else None
+        self.raw_state = itemData.get('state')
+        self.pattern = itemData.get('stateDescription', {}).get('pattern')
+
+    @update_proxy
+    def update_state(self, value):
+        """Set state received from openHAB, e.g. via event stream"""
+        self.attribs['state'] = self.state_from_string(value)
+        self.raw_state = value
+
+    def state_changed(self, itemData):
+        """Return True if the state in itemData differs from the shown state. That's not only the last state
+           received (raw_state), but also the expected state of a command which isn't confirmed yet."""
+        if itemData.get('state') != self.raw_state:
+            return True
+        state = self.state_from_string(itemData['state']) if 'state' in itemData else None
+        return state != self.attribs['state']
 
     def state_from_string(self, value):
         raise RuntimeError()
@@ -645,25 +1446,57 @@ class ItemBase(object):
         new_state = self.test_state_value(value)
         if self.attribs['state'] != new_state:
             self.attribs['state'] = new_state
+            self.oh.item_touched(self)
             self.post_state()  # send update to openHAB
 
-    def send_command(self, value):
-        """ post command to openHAB, used for actor items """
-        resp = requests.post(self.link, data=value, headers=self.oh.http_put_headers, proxies=self.oh.http_proxies)
+    def send_command(self, value, state=None, coalesce=False):
+        """ queue command for openHAB, used for actor items. The command is sent in background, state is the
+            expected item state after the command and is shown immediately. If coalesce is True, a pending
+            command of this item is replaced by this command (used for absolute values). """
+        prev_state = self.attribs['state']
+        if state is not None:
+            self.attribs['state'] = state
+            self.oh.item_touched(self)
+        self.oh.dispatcher.submit(self, value, prev_state, coalesce)
+
+    def send_command_blocked(self, value):
+        """ post command to openHAB """
+        resp = self.oh.http.post(self.link, data=value, headers=self.oh.http_put_headers,
+                                 proxies=self.oh.http_proxies)
         if resp.status_code != requests.codes.ok:
             resp.raise_for_status()
 
+    def command_done(self, cmd, error):
+        """ called by the command dispatcher, reconcile state if the command failed """
+        if error is None or self.oh.dispatcher.pending(self):
+            return      # nothing to do or a later command is still pending
+        if isinstance(error, CommandRejectedError):
+            # command was not sent, openHAB still has the previous state
+            # ==> no need to fetch it, this is called by the GUI thread submitting the command
+            self.restore_state(cmd.prev_state)
+            return
+        try:
+            self.get_state()
+        except requests.exceptions.RequestException:
+            self.restore_state(cmd.prev_state)
+
+    @update_proxy
+    def restore_state(self, value):
+        self.attribs['state'] = value
+        self.oh.item_touched(self)
+
     def post_state(self):
         """ post state update to openHAB, used for sensor items """
-        resp = requests.put(self.link + '/state', data=self.state_to_string(self.attribs['state']),
-                            headers=self.oh.http_put_headers, proxies=self.oh.http_proxies)
+        resp = self.oh.http.put(self.link + '/state', data=self.state_to_string(self.attribs['state']),
+                                headers=self.oh.http_put_headers, proxies=self.oh.http_proxies)
         if resp.status_code != requests.codes.ok:
             resp.raise_for_status()
 
     def get_state(self, headers=None):
         (result, headers) = self.oh.fetch_abs_json_url(self.link, headers)
-        if 'state' in result:
+        if 'state' in result and self.state_changed(result):
             self.init(result)
+            self.oh.item_changed(self)
         self.atmos_id = headers.get('x-atmosphere-tracking-id')
 
     def get_state_blocked(self):
@@ -674,6 +1507,8 @@ class ItemBase(object):
 
 
 class CallItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(CallItem, self).__init__(oh, itemData)
 
@@ -701,6 +1536,8 @@ class CallItem(ItemBase):
 
 
 class ColorItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(ColorItem, self).__init__(oh, itemData)
 
@@ -737,18 +1574,20 @@ class ColorItem(ItemBase):
     def cmd_set_pct(self, value):
         if not isinstance(value, (int, float, Decimal)):
             raise TypeError()
-        self.send_command(str(value))
+        self.send_command(str(value), coalesce=True)
         #self.attribs['state'] = value
 
     @update_proxy
     def cmd_set_hsv(self, value):
         if not isinstance(value, collections.Sequence):
             raise TypeError()
-        self.send_command(','.join(map(lambda x: str(x), value)))
+        self.send_command(','.join(map(lambda x: str(x), value)), coalesce=True)
         #self.attribs['state'] = value
 
 
 class ContactItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(ContactItem, self).__init__(oh, itemData)
 
@@ -777,6 +1616,8 @@ class ContactItem(ItemBase):
 
 
 class DateTimeItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(DateTimeItem, self).__init__(oh, itemData)
 
@@ -803,6 +1644,8 @@ class DateTimeItem(ItemBase):
 
 
 class DimmerItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(DimmerItem, self).__init__(oh, itemData)
 
@@ -827,8 +1670,7 @@ class DimmerItem(ItemBase):
     def cmd_set(self, value):
         if not isinstance(value, (int, float, Decimal)):
             raise TypeError()
-        self.send_command(str(value))
-        self.attribs['state'] = value
+        self.send_command(str(value), value, coalesce=True)
 
     def cmd_on(self):
         self.send_command('ON')
@@ -847,6 +1689,8 @@ class DimmerItem(ItemBase):
 
 
 class GroupItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(GroupItem, self).__init__(oh, itemData)
 
@@ -861,6 +1705,8 @@ class GroupItem(ItemBase):
 
 
 class LocationItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(LocationItem, self).__init__(oh, itemData)
 
@@ -883,6 +1729,8 @@ class LocationItem(ItemBase):
 
 
 class NumberItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(NumberItem, self).__init__(oh, itemData)
 
@@ -907,11 +1755,12 @@ class NumberItem(ItemBase):
     def cmd_set(self, value):
         if not isinstance(value, (int, float, Decimal)):
             raise TypeError()
-        self.send_command(str(value))
-        self.attribs['state'] = value
+        self.send_command(str(value), value, coalesce=True)
 
 
 class RollerShutterItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(RollerShutterItem, self).__init__(oh, itemData)
 
@@ -939,8 +1788,7 @@ class RollerShutterItem(ItemBase):
     def cmd_set(self, value):
         if not isinstance(value, (int, float, Decimal)):
             raise TypeError()
-        self.send_command(str(value))
-        self.attribs['state'] = value
+        self.send_command(str(value), value, coalesce=True)
 
     def cmd_stop(self):
         self.send_command('STOP')
@@ -959,6 +1807,8 @@ class RollerShutterItem(ItemBase):
 
 
 class StringItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(StringItem, self).__init__(oh, itemData)
 
@@ -983,11 +1833,12 @@ class StringItem(ItemBase):
     def cmd_set(self, value):
         if not isinstance(value, str):
             raise TypeError()
-        self.send_command(value)
-        self.attribs['state'] = value
+        self.send_command(value, value)
 
 
 class SwitchItem(ItemBase):
+    __slots__ = ()
+
     def __init__(self, oh, itemData):
         super(SwitchItem, self).__init__(oh, itemData)
 
@@ -1018,27 +1869,24 @@ class SwitchItem(ItemBase):
     def cmd_set(self, value):
         if not isinstance(value, bool):
             raise TypeError()
-        self.send_command(self.state_to_string(value))
-        self.attribs['state'] = value
+        self.send_command(self.state_to_string(value), value)
 
     @update_proxy
     def cmd_on(self):
-        self.send_command('ON')
-        self.attribs['state'] = True
+        self.send_command('ON', True)
 
     @update_proxy
     def cmd_off(self):
-        self.send_command('OFF')
-        self.attribs['state'] = False
+        self.send_command('OFF', False)
 
     @update_proxy
     def cmd_toggle(self):
-        self.send_command('TOGGLE')
-        self.attribs['state'] = not self.attribs['state']
+        self.send_command('TOGGLE', not self.attribs['state'])
 
 
 if __name__ == '__main__':
     oh = Server('localhost')
     oh.poll_pages = True
     oh.load_sitemaps()
-    homepage = oh.sitemaps['demo'].load_page()
\ No newline at end of file
+    homepage = oh.sitemaps['demo'].load_page()
+    oh.poll_scheduler.set_hot_pages([homepage])
@@ -0,0 +1,108 @@
+# coding=utf-8
+
+import threading
+from debugout import debugPrint
+
+
+class PollScheduler(object):
+    """Long-poll only the pages which are currently visible.
+
+       The hot set consists of the pages set by set_hot_pages (typically the pages on the window stack)
+       plus all pinned pages. Every hot page gets a poll thread. Pages leaving the hot set are paused,
+       their thread exits after the running long-poll request returns. A paused page is marked for a
+       catch-up fetch which is executed first if the page becomes hot again.
+
+       If long_poll is False (e.g. if item states are received via an event stream), hot pages are not
+       long-polled, only catch-up fetches and refresh requests are executed."""
+
+    def __init__(self, oh, target):
+        self.oh = oh
+        self.target = target        # thread function, called with the page as argument
+        self.lock = threading.Lock()
+        self.hot = frozenset()      # ids of visible pages
+        self.pinned = set()         # ids of pages which are always polled
+        self.threads = {}           # page id -> poll thread
+        self.long_poll = True       # False = fetch pages only on demand
+
+    def is_hot(self, page):
+        return page.id_ in self.hot or page.id_ in self.pinned
+
+    def set_hot_pages(self, pages):
+        """Replace the set of visible pages. Pages not in the set any more are paused."""
+        with self.lock:
+            hot = frozenset([p.id_ for p in pages])
+            paused = self.hot - hot
+            self.hot = hot
+            for id_ in paused:
+                self.pause(id_)
+        for p in pages:
+            self.start(p)
+
+    def pin(self, page):
+        """Add page to the configurable hot set, pinned pages are polled even if not visible."""
+        with self.lock:
+            self.pinned.add(page.id_)
+        self.start(page)
+
+    def unpin(self, page):
+        with self.lock:
+            self.pinned.discard(page.id_)
+            self.pause(page.id_)
+
+    def pause(self, id_):
+        # state is outdated as soon as the page is not polled any more
+        if id_ in self.hot or id_ in self.pinned:
+            return
+        page = self.oh.pages.get(id_)
+        if page is not None:
+            page.needs_catch_up = True
+
+    def forget(self, page):
+        """Called if page was evicted from the model, its thread exits after the running poll."""
+        with self.lock:
+            self.pinned.discard(page.id_)
+
+    def refresh(self, page):
+        """Fetch page again if visible, e.g. because an item of the page has changed."""
+        if self.is_hot(page):
+            page.needs_catch_up = True
+            self.start(page)
+
+    def start(self, page):
+        """Start a poll thread for page if not already running."""
+        if not self.oh.poll_pages or not self.oh.alive:
+            return
+        with self.lock:
+            if page.id_ in self.threads:
+                return      # thread still running, it re-checks the hot set after every poll
+            if not self.long_poll and not page.needs_catch_up:
+                return      # nothing to do, page is up to date
+            t = threading.Thread(target=self.target, args=(page,))
+            t.daemon = True
+            self.threads[page.id_] = t
+            count = len(self.threads)
+        self.oh.http.ensure_capacity(count + 2)
+        debugPrint(5, 'PollScheduler: resume page %s, %d pages polled', page.id_, count)
+        t.start()
+
+    def keep_polling(self, page):
+        """Called by the poll thread after every poll. Returns False if the thread shall exit."""
+        with self.lock:
+            if self.is_hot(page) and (self.long_poll or page.needs_catch_up):
+                return True
+            del self.threads[page.id_]
+            page.atmos_id = None
+        debugPrint(5, 'PollScheduler: stop polling page %s', page.id_)
+        return False
+
+    def thread_done(self, page):
+        """Called by the poll thread when it exits for any reason, e.g. an unexpected exception.
+           Afterwards start can create a new thread for the page."""
+        with self.lock:
+            if self.threads.get(page.id_) is threading.current_thread():
+                del self.threads[page.id_]
+                page.needs_catch_up = True  # thread died while polling, state might be outdated
+
+    def get_stats(self):
+        with self.lock:
+            return {'hot': len(self.hot), 'pinned': len(self.pinned), 'threads': len(self.threads)}
@@ -0,0 +1,126 @@
+# coding=utf-8
+
+import heapq
+import threading
+import time
+import requests
+from debugout import debugPrint
+
+
+class Prefetcher(object):
+    """Fetch the linked pages of the visible page in background, so entering a sub menu shows fresh data
+       without waiting for the network.
+
+       Linked pages are prioritized by their distance to the cursor position and by how often they were
+       visited. Linked pages of prefetched pages are fetched up to the configured depth. Prefetching
+       pauses as long as user-initiated (foreground) fetches are running."""
+
+    def __init__(self, oh, workers=2, depth=1, max_age=60):
+        self.oh = oh
+        self.workers = workers
+        self.depth = depth          # 0 = disabled, 1 = linked pages of the visible page, ...
+        self.max_age = max_age      # prefetched pages older than max_age [s] are fetched again
+        self.cond = threading.Condition()
+        self.threads = []
+        self.heap = []              # pending requests: (depth, priority, sequence number, page)
+        self.queued = set()         # ids of pages in heap
+        self.seq = 0
+        self.usage = {}             # page id -> number of visits
+        self.foreground = 0         # number of running foreground fetches
+        self.idle = threading.Event()   # set if no foreground fetch is running
+        self.idle.set()
+        self.fetched = 0            # number of prefetched pages
+
+    def visited(self, page):
+        with self.cond:
+            self.usage[page.id_] = self.usage.get(page.id_, 0) + 1
+
+    def forget(self, page):
+        """Called if page was evicted from the model."""
+        with self.cond:
+            self.usage.pop(page.id_, None)
+
+    def foreground_begin(self):
+        with self.cond:
+            self.foreground += 1
+            self.idle.clear()
+
+    def foreground_end(self):
+        with self.cond:
+            self.foreground -= 1
+            if self.foreground == 0:
+                self.idle.set()
+
+    def schedule(self, candidates, cursor):
+        """Replace pending requests by the given candidates, a list of (list position, page) tuples."""
+        if self.depth <= 0:
+            return
+        now = time.time()
+        with self.cond:
+            self.heap = []
+            self.queued = set()
+            for pos, page in candidates:
+                if now - page.fetched_at > self.max_age:
+                    # show catch-up state until prefetched, the page might be entered before
+                    page.needs_catch_up = True
+                self.push(1, float(abs(pos - cursor)), page)
+            if len(self.threads) < self.workers and self.heap:
+                t = threading.Thread(target=self.worker_thread)
+                t.daemon = True
+                self.threads.append(t)
+                t.start()
+            self.cond.notify_all()
+
+    def push(self, depth, distance, page):
+        # must be called with acquired lock
+        if page.id_ in self.queued:
+            return
+        self.seq += 1
+        priority = distance / (1 + self.usage.get(page.id_, 0))
+        heapq.heappush(self.heap, (depth, priority, self.seq, page))
+        self.queued.add(page.id_)
+
+    def worker_thread(self):
+        while self.oh.alive:
+            with self.cond:
+                while not self.heap and self.oh.alive:
+                    self.cond.wait()
+                if not self.oh.alive:
+                    return
+                (depth, priority, seq, page) = heapq.heappop(self.heap)
+                self.queued.discard(page.id_)
+
+            # user-initiated fetches always first
+            self.idle.wait()
+
+            if not page.needs_catch_up or self.oh.poll_scheduler.is_hot(page):
+                continue    # page is up to date or already fetched by the poll scheduler
+            if self.oh.pages.get(page.id_) is not page:
+                continue    # page was evicted meanwhile
+            try:
+                page.get_page(background=True)
+                page.needs_catch_up = False
+            except requests.exceptions.RequestException as e:
+                debugPrint(5, 'Prefetcher: %s for page %s', repr(e), page.id_)
+                continue
+            except Exception as e:
+                debugPrint(1, 'Prefetcher: %s for page %s' % (repr(e), page.id_))
+                continue
+
+            with self.cond:
+                self.fetched += 1
+                if depth < self.depth:
+                    for linked in page.linked_pages():
+                        self.push(depth + 1, priority, linked)
+
+    def close(self):
+        """Wake up all worker threads, they exit because the server is not alive any more."""
+        with self.cond:
+            self.heap = []
+            self.queued = set()
+            self.cond.notify_all()
+        self.idle.set()
+
+    def get_stats(self):
+        with self.cond:
+            return {'pending': len(self.heap), 'fetched': self.fetched, 'foreground': self.foreground}
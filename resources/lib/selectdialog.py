@@ -1,7 +1,9 @@
 # coding=utf-8
 
+import time
 import xbmcaddon
 import xbmcgui
+from debugout import debugPrint
 
 # selectdialog.xml control ID's
 CONTROL_ID_LIST = 1100
@@ -12,22 +14,42 @@ WINDOW_EXIT_CODES = frozenset([xbmcgui.ACTION_PARENT_DIR,
                                xbmcgui.ACTION_NAV_BACK,
                                xbmcgui.KEY_BUTTON_BACK])
 
+# long item lists are shown in a window of WINDOW_ROWS rows, which is moved if the focus gets closer than
+# WINDOW_MARGIN rows to its border (two pages of selectdialog.xml)
+WINDOW_ROWS = 100
+WINDOW_MARGIN = 22
+
 
 class SelectDialog(xbmcgui.WindowXMLDialog):
-    def __new__(cls, title, items, index=0):
+    def __new__(cls, title, items, index=0, label=None):
         return super(SelectDialog, cls).__new__(cls, "selectdialog.xml", xbmcaddon.Addon().getAddonInfo('path'))
 
     # init window
-    def __init__(self, title, items, index=None):
+    def __init__(self, title, items, index=None, label=None):
+        """items is any iterable, sequences (e.g. a lazy range) are not copied. If label is given, it's called with
+           an item to get its label, which is done only for the items in the shown window."""
         super(SelectDialog, self).__init__()
         self.control = None
         self.title = title
-        self.items = items
+        self.items = self.get_sequence(items)
+        self.label = label
         self.index = index
         self.result = None
-        self.listitems = []
+        self.listitems = []     # xbmcgui.ListItem of the shown window, reused if the window moves
+        self.labels = []        # labels of listitems
+        self.selected = None    # position of the list item with the selected flag
+        self.offset = 0     # position of the first list item in items
+        self.opened_at = None
+        self.open_time = None   # time from show until the list was shown [s]
+
+    @staticmethod
+    def get_sequence(items):
+        if hasattr(items, '__getitem__') and hasattr(items, '__len__'):
+            return items
+        return list(items)
 
     def show(self):
+        self.opened_at = time.time()
         self.doModal()
         return self.result
 
@@ -37,28 +59,68 @@ class SelectDialog(xbmcgui.WindowXMLDialog):
             self.setProperty('title', self.title)
 
     def set_items(self, items):
-        self.items = items
-        # rebuild whole menu if item list has changed
-        self.build_list()
+        self.items = self.get_sequence(items)
+        if self.control:
+            # keep the focus, only changed rows are updated
+            pos = self.control.getSelectedPosition()
+            self.build_list(self.offset + pos if pos >= 0 else None, move_focus=False)
+
+    def get_listitem(self, index):
+        # list item of items[index] or None if it's outside of the shown window
+        if index is None or not 0 <= index - self.offset < len(self.listitems):
+            return None
+        return self.listitems[index - self.offset]
 
     def set_index(self, index):
-        if self.index is not None:
-            self.listitems[self.index].select(False)
         self.index = index
-        if self.index is not None:
-            self.listitems[self.index].select(True)
+        if self.control:
+            self.update_selected()
+
+    def update_selected(self):
+        # move the selected flag to the list item of index, if it is shown
+        row = self.index - self.offset if self.get_listitem(self.index) is not None else None
+        if row != self.selected:
+            if self.selected is not None:
+                self.listitems[self.selected].select(False)
+            if row is not None:
+                self.listitems[row].select(True)
+            self.selected = row
+
+    def build_list(self, focus=None, move_focus=True):
+        """Show the window of items around focus (default: the selected item) and move the focus there.
+           If move_focus is False, the window stays where it is, so the focused row keeps its item.
+           Existing list items are relabeled, new ones are only created if the window grows."""
+        if focus is None:
+            focus = self.index
+        size = len(self.items)
+        if size <= WINDOW_ROWS:
+            self.offset = 0
+        elif move_focus:
+            self.offset = max(0, min((focus or 0) - WINDOW_ROWS // 2, size - WINDOW_ROWS))
+        else:
+            self.offset = max(0, min(self.offset, size - WINDOW_ROWS))
+        labels = self.items[self.offset:self.offset + WINDOW_ROWS]
+        if self.label is not None:
+            labels = [self.label(x) for x in labels]
 
-    def build_list(self):
-        self.control.reset()
-        self.listitems = []
-        for x in self.items:
-            li = xbmcgui.ListItem(label=x)
-            self.listitems.append(li)
-            self.control.addItem(li)
+        if len(labels) < len(self.listitems):
+            # rows can't be removed from the control one by one
+            self.control.reset()
+            self.listitems = []
+            self.labels = []
+            self.selected = None
+        for row in range(len(self.listitems)):
+            if self.labels[row] != labels[row]:
+                self.listitems[row].setLabel(labels[row])
+        if len(labels) > len(self.listitems):
+            new = [xbmcgui.ListItem(label=x) for x in labels[len(self.listitems):]]
+            self.control.addItems(new)
+            self.listitems.extend(new)
+        self.labels = labels
 
-        if self.index is not None:
-            self.listitems[self.index].select(True)     # set selected flag
-            self.control.selectItem(self.index)         # move focus to selected item
+        self.update_selected()     # set selected flag
+        if move_focus and focus is not None and self.get_listitem(focus) is not None:
+            self.control.selectItem(focus - self.offset)    # move focus to selected item
 
     # window init callback
     def onInit(self):
@@ -66,14 +128,26 @@ class SelectDialog(xbmcgui.WindowXMLDialog):
         self.build_list()
         self.setProperty('title', self.title)
         self.setFocusId(CONTROL_ID_LIST)
+        if self.opened_at is not None:
+            self.open_time = time.time() - self.opened_at
+            debugPrint(5, 'SelectDialog: %d items, %d list items, opened in %.3fs',
+                       len(self.items), len(self.listitems), self.open_time)
 
     # window action callback
     def onAction(self, action):
         if action.getId() in WINDOW_EXIT_CODES:
             self.close()
+        elif self.control and len(self.items) > len(self.listitems):
+            # move the window if the focus gets close to its border
+            pos = self.control.getSelectedPosition()
+            more_above = self.offset > 0
+            more_below = self.offset + len(self.listitems) < len(self.items)
+            if (more_above and pos < WINDOW_MARGIN) or (more_below and pos >= len(self.listitems) - WINDOW_MARGIN):
+                self.build_list(self.offset + pos)
 
     # mouse click action
     def onClick(self, controlId):
         if controlId == CONTROL_ID_LIST:
-            self.result = self.control.getSelectedPosition()
+            pos = self.control.getSelectedPosition()
+            self.result = self.offset + pos if pos >= 0 else None
         self.close()
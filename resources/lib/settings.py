@@ -0,0 +1,79 @@
+# coding=utf-8
+
+import collections
+import threading
+import xbmc
+import xbmcaddon
+
+
+def _text(value):
+    return value
+
+
+def _bool(value):
+    return value == 'true'
+
+
+def _int(value):
+    return int(float(value or 0))
+
+
+# setting id -> conversion of the string returned by getSetting
+SETTINGS = [
+    ('server', _text),
+    ('event_stream', _bool),
+    ('sitemap_subscription', _bool),
+    ('host', _text),
+    ('port', _text),
+    ('sitemap', _text),
+    ('reconnect', _bool),
+    ('prefetch_depth', _int),
+    ('service', _bool),
+    ('proxy', _text),
+    ('authentication', _text),
+    ('auth_basic_username', _text),
+    ('auth_basic_password', _text),
+    ('debug', _bool),
+]
+
+Settings = collections.namedtuple('Settings', [id_ for id_, conv in SETTINGS])
+
+_lock = threading.Lock()
+_current = None     # current Settings snapshot, None = not loaded yet
+callbacks = []      # called with (old, new) snapshot if settings have changed
+
+
+def load():
+    # a new Addon object is required, older objects may return outdated settings
+    addon = xbmcaddon.Addon()
+    return Settings(*[conv(addon.getSetting(id_)) for id_, conv in SETTINGS])
+
+
+def get():
+    """Return the current settings snapshot. The snapshot is immutable, read it once per operation."""
+    global _current
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _current = load()
+    return _current
+
+
+def refresh():
+    """Load the settings again and notify all callbacks if anything has changed."""
+    global _current
+    new = load()
+    with _lock:
+        old = _current
+        _current = new
+    if old is not None and old != new:
+        for cb in callbacks:
+            cb(old, new)
+
+
+class SettingsMonitor(xbmc.Monitor):
+    def onSettingsChanged(self):
+        refresh()
+
+
+MONITOR = SettingsMonitor()
@@ -0,0 +1,48 @@
+# coding=utf-8
+
+import json
+import os
+import zlib
+from debugout import debugPrint
+
+SNAPSHOT_VERSION = 1
+
+
+def save(path, key, data):
+    """Store data as compressed json. key identifies the server configuration the data belongs to."""
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        raw = json.dumps({'version': SNAPSHOT_VERSION, 'key': key, 'data': data}, separators=(',', ':'))
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(zlib.compress(raw))
+        # replace old snapshot only if new snapshot was written completely
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+        debugPrint(5, 'snapshot saved, path=%s, size=%d (%d uncompressed)', path, os.path.getsize(path), len(raw))
+    except (IOError, OSError, TypeError, ValueError) as e:
+        debugPrint(1, 'saving snapshot failed, path=%s, e=%s' % (path, repr(e)))
+
+
+def load(path, key):
+    """Load data stored by save. Returns None if there is no valid snapshot for key."""
+    try:
+        with open(path, 'rb') as f:
+            result = json.loads(zlib.decompress(f.read()))
+    except (IOError, OSError, ValueError, zlib.error) as e:
+        debugPrint(5, 'loading snapshot failed, path=%s, e=%s', path, repr(e))
+        return None
+    if result.get('version') != SNAPSHOT_VERSION or result.get('key') != key:
+        return None
+    return result.get('data')
+
+
+def remove(path):
+    """Delete the snapshot, e.g. because it shows a sitemap which doesn't exist any more."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
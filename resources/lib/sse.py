@@ -0,0 +1,38 @@
+# coding=utf-8
+
+
+def iter_events(lines):
+    """Parse a server-sent events stream (text/event-stream) incrementally.
+       lines is an iterable of the received lines without line endings, e.g. requests' iter_lines.
+       Yields a tuple (event, data) for every complete event, event defaults to 'message'."""
+    event = None
+    data = []
+    for line in lines:
+        if not line:
+            # empty line dispatches the event
+            if data:
+                yield event or 'message', '\n'.join(data)
+            event = None
+            data = []
+            continue
+        if line.startswith(':'):
+            continue    # comment, used as keep-alive
+        field, sep, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'data':
+            data.append(value)
+        elif field == 'event':
+            event = value
+        # id and retry are not used
+
+
+# HTTP status codes of a stream request meaning the server doesn't provide the stream at all
+NOT_SUPPORTED_CODES = frozenset([404, 405, 501])
+
+
+def not_supported(error):
+    """Return True if the HTTPError of a stream request means the stream is not supported by the server.
+       Other errors (e.g. 500 or 503 while openHAB is restarting) are transient, the request shall be retried."""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in NOT_SUPPORTED_CODES
@@ -0,0 +1,113 @@
+# coding=utf-8
+
+import threading
+import time
+from debugout import debugPrint
+
+
+class Update(object):
+    def __init__(self, target, changed, deleted, queued_at):
+        self.target = target
+        self.changed = dict(changed)
+        self.deleted = set(deleted)
+        self.queued_at = queued_at      # time of the first not yet applied change
+
+    def merge(self, changed, deleted):
+        # later changes win, a deleted key may be set again and vice versa
+        for key in deleted:
+            self.changed.pop(key, None)
+            self.deleted.add(key)
+        for key, value in changed.items():
+            self.changed[key] = value
+            self.deleted.discard(key)
+
+
+class UpdateQueue(object):
+    """Apply model changes to the list items in one GUI thread instead of in the poll threads.
+
+       Changes of the same target are merged until the frame window is over, then all pending updates
+       are applied in one pass by calling target.apply(changed, deleted). A burst of changes of one
+       widget results in one apply call with the latest values."""
+
+    def __init__(self, window=0.05):
+        self.window = window    # time to collect changes before they are applied [s]
+        self.cond = threading.Condition()
+        self.thread = None
+        self.pending = {}       # id(target) -> Update
+        self.order = []         # pending updates in order of their first change
+        self.closed = False
+        self.received = 0       # number of queued changes
+        self.applied = 0        # number of apply calls
+        self.batches = 0        # number of passes
+        self.latency_sum = 0.0  # sum of time between first change and apply [s]
+        self.latency_max = 0.0
+
+    def put(self, target, changed, deleted):
+        """Queue changes of target, returns immediately."""
+        with self.cond:
+            if self.closed:
+                return
+            self.received += 1
+            u = self.pending.get(id(target))
+            if u is not None:
+                u.merge(changed, deleted)
+                return
+            u = Update(target, changed, deleted, time.time())
+            self.pending[id(target)] = u
+            self.order.append(u)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker_thread)
+                self.thread.daemon = True
+                self.thread.start()
+            self.cond.notify_all()
+
+    def worker_thread(self):
+        while True:
+            with self.cond:
+                while not self.order and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                # collect further changes until the frame window of the oldest change is over
+                deadline = self.order[0].queued_at + self.window
+                while time.time() < deadline and not self.closed:
+                    self.cond.wait(deadline - time.time())
+                if self.closed:
+                    return
+                batch = self.order
+                self.order = []
+                self.pending = {}
+
+            now = time.time()
+            for u in batch:
+                try:
+                    u.target.apply(u.changed, u.deleted)
+                except Exception as e:
+                    debugPrint(1, 'UpdateQueue: apply failed for %s: %s' % (u.target, repr(e)))
+
+            with self.cond:
+                self.applied += len(batch)
+                self.batches += 1
+                for u in batch:
+                    latency = now - u.queued_at
+                    self.latency_sum += latency
+                    self.latency_max = max(self.latency_max, latency)
+            debugPrint(5, 'UpdateQueue: applied %d updates, latency %.3fs', len(batch), now - batch[0].queued_at)
+
+    def close(self):
+        """Stop the worker thread, pending changes are dropped."""
+        with self.cond:
+            self.closed = True
+            dropped = len(self.order)
+            self.order = []
+            self.pending = {}
+            self.cond.notify_all()
+        if dropped:
+            debugPrint(5, 'UpdateQueue: closed, %d updates not applied', dropped)
+
+    def get_stats(self):
+        with self.cond:
+            return {'pending': len(self.order), 'received': self.received, 'applied': self.applied,
+                    'batches': self.batches,
+                    'latency_avg': self.latency_sum / self.applied if self.applied else 0.0,
+                    'latency_max': self.latency_max}
@@ -0,0 +1,97 @@
+# coding=utf-8
+
+import threading
+import xbmc
+import requests
+import resources.lib.connect as connect
+import resources.lib.ipc as ipc
+import resources.lib.settings as settings
+from resources.lib.debugout import debugPrint
+
+
+class Service(object):
+    """Keep a connected server with the sitemap model up to date in background. The main window requests a
+       snapshot of the model over ipc and shows it immediately, it's usually more recent than the snapshot
+       file saved by the last window. The window still creates its own server connection and revalidates
+       the snapshot, only the first paint doesn't wait for the network."""
+
+    def __init__(self):
+        self.settings = None        # settings snapshot the server was created with
+        self.oh = None
+        self.sitemap = None
+        self.ipc = None
+
+    def start(self, s):
+        self.settings = s
+        self.oh = connect.create_server(s)
+        self.oh.poll_pages = True
+        self.oh.prefetcher.depth = s.prefetch_depth
+        try:
+            self.oh.load_sitemaps()
+            self.sitemap = self.oh.sitemaps[s.sitemap]
+            homepage = self.sitemap.load_page()
+        except (requests.exceptions.RequestException, KeyError) as e:
+            debugPrint(1, "service: connect failed, host=%s, port=%s, sitemap=%s, e=%s" %
+                       (s.host, s.port, s.sitemap, repr(e)))
+            self.stop()
+            return
+        if s.server == '1' and s.event_stream:   # openhab2 only
+            self.oh.start_event_stream()
+        self.oh.poll_scheduler.pin(homepage)
+        self.prefetch()
+
+        self.ipc = ipc.IpcServer(connect.SERVICE_PATH, self.handle)
+        self.ipc.start()
+        debugPrint(5, 'service: started, sitemap=%s', s.sitemap)
+
+    def stop(self):
+        if self.ipc is not None:
+            self.ipc.close()
+            self.ipc = None
+        if self.oh is not None:
+            self.oh.close()
+            self.oh = None
+        self.sitemap = None
+
+    def prefetch(self):
+        # keep the linked pages of the homepage fresh, they are the first pages entered
+        page = self.sitemap.page
+        self.oh.prefetcher.schedule(list(enumerate(page.linked_pages())), 0)
+
+    def handle(self, request):
+        if request.get('cmd') == 'snapshot':
+            if self.sitemap is None or request.get('key') != connect.get_snapshot_key(self.settings):
+                return {'data': None}
+            return {'data': self.oh.get_snapshot(self.sitemap)}
+        return {'error': 'unknown command'}
+
+    def update(self):
+        """Start, stop or restart the server according to the current settings."""
+        s = settings.get()
+        if not s.service or not ipc.available():
+            self.stop()
+        elif self.oh is None or s._replace(debug=self.settings.debug) != self.settings:
+            self.stop()
+            self.start(s)
+        else:
+            self.prefetch()
+
+
+UPDATE_INTERVAL = 30    # [s]
+
+if __name__ == '__main__':
+    monitor = xbmc.Monitor()
+    service = Service()
+    changed = threading.Event()     # set if settings have changed => apply immediately
+    changed.set()
+    settings.callbacks.append(lambda old, new: changed.set())
+    ticks = 0
+    while not monitor.abortRequested():
+        if changed.is_set() or ticks >= UPDATE_INTERVAL:
+            changed.clear()
+            ticks = 0
+            service.update()
+        if monitor.waitForAbort(1):
+            break
+        ticks += 1
+    service.stop()
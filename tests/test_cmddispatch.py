@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Tests of the command dispatcher with openHAB 2 items against a local stub server.
+   Run from the addon directory: python -m unittest discover tests"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from decimal import Decimal
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:     # python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import kodi
+
+kodi.install()     # Kodi modules are required by the model
+import openhab2
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Item Temp of openHAB. Commands are recorded, the first one is held until the test releases it."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length'])).decode('utf-8')
+        stub = self.server
+        with stub.lock:
+            stub.commands.append(body)
+            first = len(stub.commands) == 1
+        if first:
+            stub.received.set()
+            stub.release.wait(5)
+        self.reply(stub.command_status)
+
+    def do_GET(self):
+        stub = self.server
+        if stub.item_status != 200:
+            self.reply(stub.item_status)
+            return
+        self.reply(200, json.dumps({'name': 'Temp', 'type': 'Number', 'state': stub.state,
+                                    'link': 'http://%s:%d/rest/items/Temp' % stub.server_address}))
+
+    def reply(self, status, body=''):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class CommandDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.commands = []       # bodies of received commands
+        self.server.received = threading.Event()    # set if the first command arrived
+        self.server.release = threading.Event()     # set to answer the first command
+        self.server.command_status = 200
+        self.server.item_status = 200
+        self.server.state = '20'
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        self.oh = openhab2.Server(*self.server.server_address)
+        self.item = self.oh.create_item_class({'name': 'Temp', 'type': 'Number', 'state': '20',
+                                               'link': 'http://%s:%d/rest/items/Temp' % self.server.server_address})
+
+    def tearDown(self):
+        self.server.release.set()
+        self.oh.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_until_done(self, timeout=5.0):
+        deadline = time.time() + timeout
+        while self.oh.dispatcher.get_stats()['pending'] and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)     # command_done runs after the command left the queue
+        self.assertEqual(self.oh.dispatcher.get_stats()['pending'], 0)
+
+    def burst(self, values):
+        # first value is in flight while the others are submitted
+        self.item.cmd_set(values[0])
+        self.assertTrue(self.server.received.wait(5))
+        for value in values[1:]:
+            self.item.cmd_set(value)
+        self.server.release.set()
+        self.wait_until_done()
+
+    def test_burst_sends_last_value(self):
+        self.burst([21, 22, 23, 24])
+        self.assertEqual(self.server.commands, ['21', '24'])
+        self.assertEqual(self.oh.dispatcher.get_stats()['dropped'], 2)
+        self.assertEqual(self.item.attribs['state'], 24)
+
+    def test_failed_burst_restores_state(self):
+        self.server.command_status = 500
+        self.server.item_status = 500     # state can't be fetched => state before the burst is restored
+        self.burst([21, 22, 23])
+        self.assertEqual(self.server.commands, ['21', '23'])
+        self.assertEqual(self.oh.dispatcher.get_stats()['failed'], 2)
+        self.assertEqual(self.item.attribs['state'], Decimal('20'))
+
+
+    def test_failed_command_fetches_state(self):
+        # openHAB still has the state from before the command, the shown expected state is replaced by it
+        self.server.command_status = 500
+        self.burst([25])
+        self.assertEqual(self.item.raw_state, '20')
+        self.assertEqual(self.item.attribs['state'], Decimal('20'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Tests of the lazy value ranges of setpoint and slider widgets.
+   Run from the addon directory: python -m unittest discover tests"""
+
+import os
+import sys
+import unittest
+from decimal import Decimal as D
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import kodi
+
+kodi.install()     # Kodi modules are required by the list items
+from menulist import DecimalRange, get_range_selections
+
+
+class DecimalRangeTest(unittest.TestCase):
+    def assertRange(self, r, values):
+        self.assertEqual(len(r), len(values))
+        self.assertEqual(list(r), values)
+        self.assertEqual([r[i] for i in range(len(r))], values)
+        for i, value in enumerate(values):
+            self.assertEqual(r.index(value), i)
+
+    def test_non_integer_step(self):
+        self.assertRange(DecimalRange(D('0'), D('1'), D('0.25')),
+                         [D('0'), D('0.25'), D('0.5'), D('0.75'), D('1')])
+        self.assertRange(DecimalRange(D('17.5'), D('18.5'), D('0.1')),
+                         [D('17.5') + i * D('0.1') for i in range(11)])
+
+    def test_value_between_steps(self):
+        r = DecimalRange(D('0'), D('1'), D('0.25'))
+        for value in (D('0.3'), D('0.2499'), D('-0.25'), D('1.25'), None, 'x'):
+            self.assertRaises(ValueError, r.index, value)
+
+    def test_negative_range(self):
+        self.assertRange(DecimalRange(D('-5'), D('-1'), D('2')), [D('-5'), D('-3'), D('-1')])
+        self.assertRange(DecimalRange(D('-1'), D('1'), D('0.5')),
+                         [D('-1'), D('-0.5'), D('0'), D('0.5'), D('1')])
+        self.assertRaises(ValueError, DecimalRange(D('-5'), D('-1'), D('2')).index, D('-4'))
+
+    def test_max_not_reachable(self):
+        # the last value is the highest one not above max
+        r = DecimalRange(D('0'), D('1'), D('0.3'))
+        self.assertRange(r, [D('0'), D('0.3'), D('0.6'), D('0.9')])
+        self.assertRaises(ValueError, r.index, D('1'))
+        self.assertRange(DecimalRange(D('-1'), D('0'), D('0.4')), [D('-1'), D('-0.6'), D('-0.2')])
+
+    def test_reverse(self):
+        r = DecimalRange(D('0'), D('1'), D('0.3'), True)
+        self.assertRange(r, [D('0.9'), D('0.6'), D('0.3'), D('0')])
+        self.assertRaises(ValueError, r.index, D('1'))
+
+    def test_single_and_empty(self):
+        self.assertRange(DecimalRange(D('5'), D('5'), D('1')), [D('5')])
+        self.assertRange(DecimalRange(D('5'), D('5.5'), D('1')), [D('5')])
+        self.assertRange(DecimalRange(D('5'), D('4'), D('1')), [])
+        self.assertRange(DecimalRange(D('0'), D('1'), D('0')), [])
+        self.assertRange(DecimalRange(D('0'), D('1'), D('-1')), [])
+        self.assertRaises(ValueError, DecimalRange(D('5'), D('4'), D('1')).index, D('5'))
+
+    def test_item_access_at_the_edges(self):
+        r = DecimalRange(D('0'), D('1'), D('0.25'))
+        self.assertEqual(r[0], D('0'))
+        self.assertEqual(r[4], D('1'))
+        self.assertEqual(r[-1], D('1'))
+        self.assertEqual(r[-5], D('0'))
+        self.assertRaises(IndexError, r.__getitem__, 5)
+        self.assertRaises(IndexError, r.__getitem__, -6)
+        self.assertEqual(r[1:3], [D('0.25'), D('0.5')])
+        self.assertEqual(r[3:10], [D('0.75'), D('1')])
+        self.assertEqual(r[-2:], [D('0.75'), D('1')])
+        self.assertEqual(r[5:], [])
+        self.assertEqual(r[::2], [D('0'), D('0.5'), D('1')])
+
+    def test_large_range(self):
+        # values are computed on access, nothing is allocated for the whole range
+        r = DecimalRange(D('0'), D('100000'), D('0.01'))
+        self.assertEqual(len(r), 10000001)
+        self.assertEqual(r[-1], D('100000'))
+        self.assertEqual(r.index(D('12345.67')), 1234567)
+
+    def test_range_selections(self):
+        r = get_range_selections({'widget_min_value': D('16'), 'widget_max_value': D('18'),
+                                  'widget_step': D('0.5')})
+        self.assertRange(r, [D('18'), D('17.5'), D('17'), D('16.5'), D('16')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""Tests of the server-sent events parser and the openHAB 2 event stream against a local stub SSE server.
+   Run from the addon directory: python -m unittest discover tests"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+import requests
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:     # python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import kodi
+
+kodi.install()     # Kodi modules are required by the model
+import openhab2
+import sse
+
+# stream as sent by openHAB, split into chunks at awkward positions
+EVENT_CHUNKS = [': keep-alive\n\n',
+                'event: message\nda', 'ta: {"topic": "smarthome/items/Temp/state"}\n',
+                '\n',
+                'data: line 1\ndata: line 2\n\n',
+                'data: no space\nid: 7\nretry: 100\n\n']
+
+# state change of item Temp as sent by openHAB
+ITEM_EVENT = {'topic': 'smarthome/items/Temp/state', 'type': 'ItemStateEvent',
+              'payload': json.dumps({'type': 'Decimal', 'value': '21'})}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    status_codes = {'/missing': 404, '/no-method': 405, '/not-implemented': 501, '/restarting': 503, '/error': 500}
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path in self.status_codes:
+            self.send_response(self.status_codes[path])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if path == '/rest/events/items':
+            # keep the stream open like openHAB does, until the test is over
+            self.write_chunk('data: %s\n\n' % json.dumps(ITEM_EVENT))
+            self.server.done.wait(5)
+        else:
+            for chunk in EVENT_CHUNKS:
+                self.write_chunk(chunk)
+        self.write_chunk('')
+        self.close_connection = True
+
+    def write_chunk(self, chunk):
+        data = chunk.encode('utf-8')
+        self.wfile.write(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(('127.0.0.1', 0), StubHandler)
+        cls.server.done = threading.Event()    # set to end open event streams
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_port
+        t = threading.Thread(target=cls.server.serve_forever)
+        t.daemon = True
+        t.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.done.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+
+class SseTest(StubServerTest):
+
+    def get(self, path):
+        return requests.get(self.url + path, headers={'accept': 'text/event-stream'}, stream=True, timeout=5)
+
+    def test_events(self):
+        resp = self.get('/rest/events')
+        resp.encoding = 'utf-8'
+        try:
+            events = list(sse.iter_events(resp.iter_lines(chunk_size=1, decode_unicode=True)))
+        finally:
+            resp.close()
+        self.assertEqual(events, [('message', '{"topic": "smarthome/items/Temp/state"}'),
+                                  ('message', 'line 1\nline 2'),
+                                  ('message', 'no space')])
+
+    def test_incomplete_event_is_dropped(self):
+        self.assertEqual(list(sse.iter_events(['event: x', 'data: 1'])), [])
+        self.assertEqual(list(sse.iter_events(['event: x', 'data: 1', ''])), [('x', '1')])
+
+    def test_not_supported(self):
+        for path in ('/missing', '/no-method', '/not-implemented'):
+            resp = self.get(path)
+            with self.assertRaises(requests.exceptions.HTTPError) as cm:
+                resp.raise_for_status()
+            self.assertTrue(sse.not_supported(cm.exception), path)
+
+    def test_transient_errors(self):
+        for path in ('/restarting', '/error'):
+            resp = self.get(path)
+            with self.assertRaises(requests.exceptions.HTTPError) as cm:
+                resp.raise_for_status()
+            self.assertFalse(sse.not_supported(cm.exception), path)
+        self.assertFalse(sse.not_supported(requests.exceptions.HTTPError('no response')))
+
+
+
+class EventStreamTest(StubServerTest):
+    def setUp(self):
+        self.oh = openhab2.Server('127.0.0.1', self.server.server_port)
+        self.item = self.oh.create_item_class({'name': 'Temp', 'type': 'Number', 'state': '20',
+                                               'link': self.url + '/rest/items/Temp'})
+
+    def tearDown(self):
+        self.oh.close()
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_item_state_event(self):
+        self.oh.resources['events'] = self.url + '/rest/events/items'
+        self.oh.start_event_stream()
+        self.assertFalse(self.oh.poll_scheduler.long_poll)
+        self.assertTrue(self.wait_for(lambda: self.item.raw_state == '21'))
+        self.assertEqual(self.item.attribs['state'], self.item.state_from_string('21'))
+        self.assertTrue(self.oh.event_stream)
+
+    def test_fall_back_to_long_polling(self):
+        self.oh.resources['events'] = self.url + '/missing'
+        self.oh.start_event_stream()
+        self.assertTrue(self.wait_for(lambda: not self.oh.event_stream))
+        self.assertTrue(self.oh.poll_scheduler.long_poll)
+        self.assertEqual(self.item.raw_state, '20')
+
+
+if __name__ == '__main__':
+    unittest.main()